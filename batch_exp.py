@@ -0,0 +1,125 @@
+import random
+from typing import List, Tuple
+import gmpy2
+from gmpy2 import mpz
+
+# Largest comb window; a 2048-bit exponent with w = 8 needs 256 rows of
+# 256 entries, about 17 MB of table for a 2048-bit modulus.
+MAX_WINDOW = 8
+
+
+def choose_window(exponent_bits: int, count: int) -> int:
+    """
+    Pick the comb window w that minimises the total number of modular
+    multiplications for count exponentiations: building the table costs
+    about (bits/w) * 2^w and each exponentiation about bits/w.
+    """
+    best_window, best_cost = 1, None
+    for w in range(1, MAX_WINDOW + 1):
+        rows = (exponent_bits + w - 1) // w
+        cost = rows * ((1 << w) + count)
+        if best_cost is None or cost < best_cost:
+            best_window, best_cost = w, cost
+    return best_window
+
+
+class FixedBaseTable:
+    """
+    Fixed-base comb table for exponentiations base^e mod modulus that all
+    share the same base, e.g. g^b_i on the receiver.
+
+    Row i holds base^(j * 2^(w*i)) for every window digit j, so base^e is a
+    product of one table entry per w-bit digit of e and needs no squarings.
+    """
+
+    def __init__(self, base: int, modulus: int, exponent_bits: int, window: int = 6):
+        self.base = mpz(base)
+        self.modulus = mpz(modulus)
+        self.window = window
+        self.exponent_bits = exponent_bits
+        self.rows = (exponent_bits + window - 1) // window
+
+        table = []
+        row_base = self.base % self.modulus
+        for _ in range(self.rows):
+            row = [mpz(1)]
+            for _ in range((1 << window) - 1):
+                row.append(row[-1] * row_base % self.modulus)
+            table.append(row)
+            row_base = row[-1] * row_base % self.modulus
+        self.table = table
+
+    def pow(self, exponent: int) -> mpz:
+        """
+        Compute base^exponent mod modulus
+        """
+        exponent = mpz(exponent)
+        if exponent < 0 or exponent.bit_length() > self.exponent_bits:
+            return gmpy2.powmod(self.base, exponent, self.modulus)
+        modulus = self.modulus
+        result = mpz(1)
+        for row, digit in zip(self.table, gmpy2.unpack(exponent, self.window)):
+            if digit:
+                result = result * row[digit] % modulus
+        return result
+
+    def pow_many(self, exponents: List[int]) -> List[mpz]:
+        """
+        Compute base^e mod modulus for every exponent e
+        """
+        return [self.pow(e) for e in exponents]
+
+
+# Number of tables kept by cached_table, per process
+TABLE_CACHE_SIZE = 4
+_table_cache = {}
+
+
+def cached_table(base: int, modulus: int, exponent_bits: int, window: int = 6) -> FixedBaseTable:
+    """
+    FixedBaseTable for base, built once per process and reused, so worker
+    processes do not rebuild the generator table for every chunk
+    """
+    key = (int(base), int(modulus), exponent_bits, window)
+    table = _table_cache.get(key)
+    if table is None:
+        if len(_table_cache) >= TABLE_CACHE_SIZE:
+            _table_cache.pop(next(iter(_table_cache)))
+        table = FixedBaseTable(base, modulus, exponent_bits, window)
+        _table_cache[key] = table
+    return table
+
+
+def fixed_base_powmod_batch(base: int, exponents: List[int], modulus: int) -> List[mpz]:
+    """
+    Compute base^e mod modulus for many exponents e sharing one base
+    """
+    if not exponents:
+        return []
+    exponent_bits = max(mpz(e).bit_length() for e in exponents)
+    table = FixedBaseTable(base, modulus, exponent_bits, choose_window(exponent_bits, len(exponents)))
+    return table.pow_many(exponents)
+
+
+def fixed_exponent_powmod_batch(bases: List[int], exponent: int, modulus: int) -> List[mpz]:
+    """
+    Compute b^exponent mod modulus for many bases b sharing one exponent,
+    e.g. decoded^a on the sender.
+
+    With a fixed exponent only the window recoding could be shared between
+    the bases, and the squarings of a Python-level sliding window are
+    slower than GMP's own windowed powmod, so the whole batch is handed to
+    gmpy2 in a single call instead.
+    """
+    if not bases:
+        return []
+    return gmpy2.powmod_base_list([mpz(b) for b in bases], mpz(exponent), mpz(modulus))
+
+
+def batch_key_agreement(table: FixedBaseTable, q: int, count: int) -> List[Tuple[int, mpz]]:
+    """
+    Generate count Diffie-Hellman key pairs (private_key, public_key) with
+    the public keys computed from a fixed-base table for the generator
+    """
+    private_keys = [random.randint(1, q) for _ in range(count)]
+    return list(zip(private_keys, table.pow_many(private_keys)))
@@ -0,0 +1,156 @@
+import math
+import secrets
+import struct
+from typing import List, Sequence
+from poly import FieldVector, fast_multi_point_evaluation, make_subproduct_tree
+from wire import decode_elements, encode_elements
+
+# Simple hashing into bins: an item y goes to bin H1(y) mod B and gets
+# point H1(y) mod p in it. Every bin is padded with dummy points up to the
+# same size L, which depends only on the number of items and bins and is
+# chosen so that no bin overflows except with probability
+# 2^-OVERFLOW_BITS, so the polynomials reveal nothing about bin loads.
+# BIN_LOAD is the mean load bin_count aims for: the padding costs a factor
+# of 1.5 in coefficients at 256 items per bin and 2.2 at 64.
+BIN_LOAD = 256
+OVERFLOW_BITS = 40
+
+# Header in front of the polynomials: number of bins and bin size
+_HEADER = struct.Struct('!II')
+
+
+def bin_count(count: int, load: int = BIN_LOAD) -> int:
+    """
+    Number of bins for count items
+    """
+    return max(1, -(-count // load))
+
+
+def bin_size(count: int, bins: int) -> int:
+    """
+    Smallest bin size L that count items hashed into bins bins exceed
+    with probability at most 2^-OVERFLOW_BITS, by the Chernoff bound
+    P[load >= L] <= e^-mu (e mu / L)^L for a mean load mu below L
+    """
+    if bins == 1 or count <= 1:
+        return max(count, 1)
+    mu = count / bins
+    size = math.floor(mu) + 1
+    while size < count:
+        log_tail = (size * (1 + math.log(mu / size)) - mu) / math.log(2)
+        if log_tail + math.log2(bins) <= -OVERFLOW_BITS:
+            return size
+        size += 1
+    return count
+
+
+def bin_of(hashed: int, bins: int) -> int:
+    """
+    Bin of an item, from its hash H1
+    """
+    return hashed % bins
+
+
+def assign_bins(hashed: Sequence[int], bins: int, size: int) -> List[List[int]]:
+    """
+    Indices of the items in every bin, by their hashes H1
+    """
+    members = [[] for _ in range(bins)]
+    for i, h in enumerate(hashed):
+        members[bin_of(h, bins)].append(i)
+    if any(len(bin_members) > size for bin_members in members):
+        raise ValueError(f"A bin holds more than {size} items")
+    return members
+
+
+def pad_points(points: Sequence[int], size: int, p: int) -> List[int]:
+    """
+    points followed by distinct random dummy points up to size
+    """
+    padded = list(points)
+    taken = set(padded)
+    while len(padded) < size:
+        x = secrets.randbelow(p)
+        if x not in taken:
+            taken.add(x)
+            padded.append(x)
+    return padded
+
+
+def bin_trees(points: Sequence[int], members: Sequence[Sequence[int]], size: int, p: int):
+    """
+    A subproduct tree per bin over the points of its items, padded to size
+    """
+    return [make_subproduct_tree(pad_points([points[i] for i in bin_members], size, p), p).precompute()
+            for bin_members in members]
+
+
+def _interpolate_bin(task):
+    """Worker entry point: polynomial of one bin, padded to its size"""
+    tree, values = task
+    poly = tree.interpolate(values)
+    return FieldVector(list(poly) + [0] * (len(tree) - len(poly)), tree.p)
+
+
+def interpolate_bins(trees, members: Sequence[Sequence[int]], values: Sequence[int], pool=None) -> List[List[int]]:
+    """
+    One polynomial of exactly the bin size per bin, taking values[i] at the
+    point of item i and random values at the dummy points
+    """
+    tasks = []
+    for tree, bin_members in zip(trees, members):
+        bin_values = [values[i] for i in bin_members]
+        bin_values += [secrets.randbelow(tree.p) for _ in range(len(tree) - len(bin_values))]
+        tasks.append((tree, bin_values))
+    if pool is None:
+        return [_interpolate_bin(task) for task in tasks]
+    return pool.map(_interpolate_bin, tasks)
+
+
+def encode_bins(polys: Sequence[Sequence[int]], p: int, start: int, stop: int) -> bytes:
+    """
+    Encode coefficients start..stop-1 of the polynomials laid end to end,
+    with the header in front of the first
+    """
+    size = len(polys[0])
+    header = _HEADER.pack(len(polys), size) if start == 0 else b''
+    coefficients = []
+    for b in range(start // size, -(-stop // size)):
+        first = max(start - b * size, 0)
+        coefficients.extend(polys[b][first:min(stop - b * size, size)])
+    return header + encode_elements(coefficients, p)
+
+
+def decode_bins(data: bytes, p: int) -> List[List[int]]:
+    """
+    The polynomials of all bins, as sent by encode_bins
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated bin header")
+    bins, size = _HEADER.unpack_from(data)
+    coefficients = decode_elements(data[_HEADER.size:], p)
+    if bins < 1 or size < 1 or len(coefficients) != bins * size:
+        raise ValueError("Bin polynomials do not match their header")
+    return [FieldVector(coefficients[b * size:(b + 1) * size], p) for b in range(bins)]
+
+
+def _evaluate_bin(task):
+    """Worker entry point: a bin's polynomial at the points hashed into it"""
+    poly, points, p = task
+    return fast_multi_point_evaluation(poly, points, p)
+
+
+def evaluate_bins(polys: Sequence[Sequence[int]], hashed: Sequence[int], p: int, pool=None) -> List[int]:
+    """
+    Evaluate the polynomial of every item's bin at the item's point, from
+    the items' hashes H1
+    """
+    members = assign_bins(hashed, len(polys), len(hashed))
+    tasks = [(poly, [hashed[i] % p for i in bin_members], p)
+             for poly, bin_members in zip(polys, members) if bin_members]
+    results = [0] * len(hashed)
+    values = pool.map(_evaluate_bin, tasks) if pool is not None else [_evaluate_bin(task) for task in tasks]
+    for bin_members, bin_values in zip([m for m in members if m], values):
+        for i, v in zip(bin_members, bin_values):
+            results[i] = v
+    return results
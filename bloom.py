@@ -0,0 +1,69 @@
+import math
+import struct
+from typing import Iterable
+
+# Bloom filter over keys that are already uniformly random, such as H2
+# outputs: the HASHES bit positions of a key come from its first 16 bytes
+# by double hashing, without hashing it again. A filter for n keys with a
+# false positive rate of 2^-k uses k hash functions and k n / ln 2 bits,
+# about 1.44 k bits per key.
+FALSE_POSITIVE_BITS = 30
+
+# Filter header: number of bits and of hash functions
+_HEADER = struct.Struct('!QB')
+
+
+class BloomFilter:
+    """
+    Bloom filter of bits bits with hashes bit positions per key
+    """
+
+    def __init__(self, bits: int, hashes: int, data: bytes = None):
+        if bits < 1 or not 1 <= hashes <= 255:
+            raise ValueError("Invalid Bloom filter parameters")
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray(-(-bits // 8))
+
+    @classmethod
+    def for_count(cls, count: int, false_positive_bits: int = FALSE_POSITIVE_BITS):
+        """
+        Empty filter for count keys with a false positive rate of
+        2^-false_positive_bits
+        """
+        return cls(max(1, math.ceil(count * false_positive_bits / math.log(2))), false_positive_bits)
+
+    def _positions(self, key: bytes):
+        if len(key) < 16:
+            raise ValueError("Bloom filter keys must have at least 16 bytes")
+        h1 = int.from_bytes(key[:8], 'big')
+        h2 = int.from_bytes(key[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: bytes):
+        data = self.data
+        for position in self._positions(key):
+            data[position >> 3] |= 1 << (position & 7)
+
+    def update(self, keys: Iterable[bytes]):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key: bytes) -> bool:
+        data = self.data
+        return all(data[position >> 3] >> (position & 7) & 1 for position in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        return _HEADER.pack(self.bits, self.hashes) + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Filter sent by to_bytes
+        """
+        if len(data) < _HEADER.size:
+            raise ValueError("Truncated Bloom filter")
+        bits, hashes = _HEADER.unpack_from(data)
+        if len(data) - _HEADER.size != -(-bits // 8):
+            raise ValueError("Bloom filter does not match its header")
+        return cls(bits, hashes, data[_HEADER.size:])
@@ -0,0 +1,297 @@
+import hashlib
+import random
+import secrets
+from typing import List, Optional, Tuple, Union
+import gmpy2
+from gmpy2 import mpz
+from utils import decode_group_element, element_size, encode_group_element_bytes
+from batch_exp import cached_table, choose_window, fixed_exponent_powmod_batch
+from params import standard_group
+from wire import decode_elements, encode_elements
+
+
+class SafePrimeGroup:
+    """
+    Subgroup of order q of Z_p* for a safe prime p = 2q + 1
+
+    Group elements are integers modulo p. Elements are encoded for the
+    permutation with the u-trick and the polynomial is interpolated over
+    the same prime p.
+    """
+
+    name = "modp"
+
+    def __init__(self, p: int, q: int, g: int, u: int):
+        self.p, self.q, self.g, self.u = mpz(p), mpz(q), mpz(g), mpz(u)
+        self.field_prime = self.p
+        self.element_size = element_size(p)
+
+    def fingerprint(self) -> str:
+        """
+        Digest identifying the group
+        """
+        digest = hashlib.sha256(self.name.encode('utf-8'))
+        for value in (self.p, self.q, self.g, self.u):
+            digest.update(str(int(value)).encode('utf-8') + b':')
+        return digest.hexdigest()
+
+    def random_scalar(self) -> int:
+        return random.randint(1, self.q)
+
+    def keygen(self) -> Tuple[int, mpz]:
+        """
+        Key pair (private_key, g^private_key)
+        """
+        private_key = self.random_scalar()
+        return private_key, gmpy2.powmod(self.g, private_key, self.p)
+
+    def keygen_batch(self, count: int) -> List[Tuple[int, mpz]]:
+        """
+        count key pairs, all exponentiated from one fixed-base table for g
+        """
+        table = cached_table(self.g, self.p, int(self.q).bit_length())
+        private_keys = [self.random_scalar() for _ in range(count)]
+        return list(zip(private_keys, table.pow_many(private_keys)))
+
+    def exp(self, element: int, scalar: int) -> mpz:
+        return gmpy2.powmod(mpz(element), mpz(scalar), self.p)
+
+    def exp_batch(self, elements: List[int], scalar: int) -> List[mpz]:
+        """
+        element^scalar for many elements sharing one scalar
+        """
+        return fixed_exponent_powmod_batch(elements, scalar, self.p)
+
+    def exp_many(self, element: int, scalars: List[int], uses: Optional[int] = None) -> List[mpz]:
+        """
+        element^scalar for many scalars sharing one element; uses is the
+        number of exponentiations the process will do with this element
+        in total, which sizes the cached fixed-base table
+        """
+        bits = int(self.q).bit_length()
+        window = choose_window(bits, uses if uses is not None else len(scalars))
+        return cached_table(element, self.p, bits, window).pow_many(scalars)
+
+    def to_bytes(self, element: int) -> bytes:
+        """
+        Fixed-width buffer of an element, the input of H3
+        """
+        return int(element).to_bytes(self.element_size, 'big')
+
+    def encode_public(self, element: int) -> bytes:
+        return encode_elements([element], self.p)
+
+    def decode_public(self, data: bytes) -> mpz:
+        values = decode_elements(data, self.p)
+        if len(values) != 1 or not 1 < values[0]:
+            raise ValueError("Invalid public key")
+        return values[0]
+
+    def is_valid(self, element: int) -> bool:
+        """
+        Check if an element from outside is in the subgroup of order q,
+        i.e. a quadratic residue other than 1
+        """
+        return 1 < element < self.p and gmpy2.jacobi(mpz(element), self.p) == 1
+
+    def encode(self, element: int) -> Optional[bytes]:
+        """
+        Uniform encoding of an element as an element_size buffer, or None
+        if the element has none
+        """
+        return encode_group_element_bytes(element, self.p, self.u)
+
+    def decode(self, data: bytes) -> mpz:
+        """
+        Element of an encoding buffer, reduced modulo p first
+        """
+        return mpz(decode_group_element(int.from_bytes(data, 'big') % self.p, self.p, self.q, self.u))
+
+
+# Curve25519: v^2 = u^3 + A u^2 + u over GF(2^255 - 19)
+CURVE25519_P = mpz(2) ** 255 - 19
+CURVE25519_A = mpz(486662)
+CURVE25519_A24 = mpz(121665)
+CURVE25519_ORDER = mpz(2) ** 252 + 27742317777372353535851937790883648493
+CURVE25519_BASE = mpz(9)
+_SQRT_MINUS_ONE = gmpy2.powmod(2, (CURVE25519_P - 1) // 4, CURVE25519_P)
+# Elligator2 representatives are at most (p - 1) / 2 < 2^254
+_REPRESENTATIVE_BITS = 254
+
+
+def _sqrt(a: mpz) -> Optional[mpz]:
+    """
+    Square root modulo 2^255 - 19 (p ≡ 5 mod 8), or None for a non-square
+    """
+    p = CURVE25519_P
+    r = gmpy2.powmod(a, (p + 3) // 8, p)
+    if r * r % p == a % p:
+        return r
+    r = r * _SQRT_MINUS_ONE % p
+    if r * r % p == a % p:
+        return r
+    return None
+
+
+def _cswap(swap: int, x: mpz, y: mpz):
+    """(y, x) if swap is 1 and (x, y) if it is 0, without branching on swap"""
+    dummy = -swap & (x ^ y)
+    return x ^ dummy, y ^ dummy
+
+
+def x25519_ladder(scalar: int, u: int) -> mpz:
+    """
+    u-coordinate of [scalar]P for the point P with u-coordinate u, by the
+    x-only Montgomery ladder in projective coordinates with one inversion
+
+    As in RFC 7748 the ladder runs over a fixed 255 bits and swaps with
+    masks instead of branching on the scalar's bits. GMP's arithmetic is
+    not constant time, though, so this does not make the ladder safe
+    against timing side channels.
+    """
+    p = CURVE25519_P
+    a24 = CURVE25519_A24
+    x1 = mpz(u) % p
+    x2, z2, x3, z3 = mpz(1), mpz(0), x1, mpz(1)
+    swap = 0
+    for bit in reversed(range(max(255, int(scalar).bit_length()))):
+        k_t = (scalar >> bit) & 1
+        swap ^= k_t
+        x2, x3 = _cswap(swap, x2, x3)
+        z2, z3 = _cswap(swap, z2, z3)
+        swap = k_t
+        a = x2 + z2
+        aa = a * a % p
+        b = x2 - z2
+        bb = b * b % p
+        e = aa - bb
+        c = x3 + z3
+        d = x3 - z3
+        da = d * a % p
+        cb = c * b % p
+        x3 = (da + cb) ** 2 % p
+        z3 = x1 * (da - cb) ** 2 % p
+        x2 = aa * bb % p
+        z2 = e * (aa + a24 * e) % p
+    x2, x3 = _cswap(swap, x2, x3)
+    z2, z3 = _cswap(swap, z2, z3)
+    return x2 * gmpy2.powmod(z2, p - 2, p) % p
+
+
+class Curve25519Group:
+    """
+    Prime-order subgroup of Curve25519 with an Elligator2 encoding
+
+    Elements are u-coordinates and scalars are clamped as in X25519, so
+    every scalar is a multiple of the cofactor 8 and the x-only ladder
+    commutes: [a]([b]B) and [b]([a]B) have the same u-coordinate. About
+    half of all points have an Elligator2 representative, encode returns
+    None for the others and the caller draws a new key. The polynomial is
+    interpolated over 2^255 - 19, so elements, encodings and coefficients
+    are all 32 bytes instead of 256.
+    """
+
+    name = "curve25519"
+
+    def __init__(self):
+        self.p = CURVE25519_P
+        self.q = CURVE25519_ORDER
+        self.g = CURVE25519_BASE
+        self.field_prime = CURVE25519_P
+        self.element_size = 32
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.name.encode('utf-8')).hexdigest()
+
+    def random_scalar(self) -> int:
+        scalar = secrets.randbits(255)
+        return (scalar & ~7) | (1 << 254)
+
+    def keygen(self) -> Tuple[int, mpz]:
+        private_key = self.random_scalar()
+        return private_key, x25519_ladder(private_key, self.g)
+
+    def keygen_batch(self, count: int) -> List[Tuple[int, mpz]]:
+        return [self.keygen() for _ in range(count)]
+
+    def exp(self, element: int, scalar: int) -> mpz:
+        return x25519_ladder(scalar, element)
+
+    def exp_batch(self, elements: List[int], scalar: int) -> List[mpz]:
+        return [x25519_ladder(scalar, element) for element in elements]
+
+    def exp_many(self, element: int, scalars: List[int], uses: Optional[int] = None) -> List[mpz]:
+        return [x25519_ladder(scalar, element) for scalar in scalars]
+
+    def to_bytes(self, element: int) -> bytes:
+        return int(element).to_bytes(self.element_size, 'big')
+
+    def encode_public(self, element: int) -> bytes:
+        return self.to_bytes(element)
+
+    def decode_public(self, data: bytes) -> mpz:
+        if len(data) != self.element_size:
+            raise ValueError("Invalid public key")
+        element = mpz(int.from_bytes(data, 'big'))
+        if element >= self.p or element < 2:
+            raise ValueError("Invalid public key")
+        return element
+
+    def is_valid(self, element: int) -> bool:
+        """
+        Check if an element from outside is a u-coordinate; points of
+        small order are harmless since every scalar is a multiple of 8
+        """
+        return 1 < element < self.p
+
+    def encode(self, element: int) -> Optional[bytes]:
+        """
+        Elligator2 representative r = sqrt(-(u + A) / (2u)) of the point,
+        the smaller of the two roots, with the two unused top bits random
+        """
+        p, A = self.p, CURVE25519_A
+        u = mpz(element) % p
+        if u == 0 or u == p - A:
+            return None
+        r = _sqrt(-(u + A) * gmpy2.invert(2 * u, p) % p)
+        if r is None:
+            return None
+        r = min(r, p - r)
+        r |= secrets.randbits(256 - _REPRESENTATIVE_BITS) << _REPRESENTATIVE_BITS
+        return int(r).to_bytes(self.element_size, 'big')
+
+    def decode(self, data: bytes) -> mpz:
+        """
+        Elligator2 map of the representative in the low 254 bits of the
+        buffer; every buffer maps to a point on the curve
+        """
+        p, A = self.p, CURVE25519_A
+        r = mpz(int.from_bytes(data, 'big') & ((1 << _REPRESENTATIVE_BITS) - 1))
+        w = -A * gmpy2.invert(1 + 2 * r * r, p) % p
+        if gmpy2.legendre((w * w + A * w + 1) * w % p, p) == -1:
+            w = (-w - A) % p
+        return w
+
+
+def hash_to_group(item: str, group) -> mpz:
+    """
+    Random oracle onto the group: the element the group decodes an
+    element_size buffer of SHAKE-256 output of the item to
+    """
+    return group.decode(hashlib.shake_256(b'group:' + item.encode('utf-8')).digest(group.element_size))
+
+
+def load_group(params: Union[str, Tuple[int, int, int, int, int]] = "modp2048"):
+    """
+    Group for a parameter tuple (p, q, h, g, u) or a name: "curve25519"
+    or "modp" followed by the size of a standardized safe-prime group
+    """
+    if isinstance(params, str):
+        if params == Curve25519Group.name:
+            return Curve25519Group()
+        if params.startswith(SafePrimeGroup.name) and params[len(SafePrimeGroup.name):].isdigit():
+            params = standard_group(int(params[len(SafePrimeGroup.name):]))
+        else:
+            raise ValueError(f"Unknown group {params}")
+    p, q, h, g, u = params
+    return SafePrimeGroup(p, q, g, u)
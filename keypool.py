@@ -0,0 +1,163 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import deque
+from typing import List, Tuple
+from utils import permutation_mapping_batch
+
+
+def generate_encodings(count: int, group, key: bytes, iv: bytes, reject: bool = True) -> List[Tuple[int, int]]:
+    """
+    Generate count pairs (b_i, Π(encode(g^b_i))) whose permuted encoding is
+    below the group's field prime, retrying the rejected ones in batches.
+    Keys whose public key has no encoding in the group are rejected too.
+    Without reject any permuted encoding is kept, for interpolation over a
+    separate field where the encodings are split into limbs.
+    """
+    p = group.field_prime if reject else 1 << (8 * group.element_size)
+    encodings = [None] * count
+    pending = list(range(count))
+    while pending:
+        rejected = []
+        key_pairs = group.keygen_batch(len(pending))
+        encoded = [group.encode(m_i) for _, m_i in key_pairs]
+        permuted = iter(permutation_mapping_batch([e for e in encoded if e is not None], key, iv))
+        for i, (b_i, _), e in zip(pending, key_pairs, encoded):
+            m_i_perm = int.from_bytes(next(permuted), 'big') if e is not None else p
+            if m_i_perm < p:
+                encodings[i] = (b_i, m_i_perm)
+            else:
+                rejected.append(i)
+        pending = rejected
+    return encodings
+
+
+class EncodingPool:
+    """
+    Pool of accepted (b_i, permuted encoding of g^b_i) pairs for the
+    receiver's Step 3, generated ahead of time
+
+    None of Step 3 depends on the sender's message, so a background thread
+    can keep the pool filled between sessions and a session only draws
+    from it. Every pair is handed out once and removed from the pool. The
+    pairs are secret key material, so a file written by save must be
+    protected like a private key.
+    """
+
+    def __init__(self, group, key: bytes, iv: bytes, size: int = 1024, batch_size: int = 64):
+        self.group = group
+        self.key, self.iv = key, iv
+        self.size = size
+        self.batch_size = batch_size
+        self._entries = deque()
+        self._lock = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def fingerprint(self) -> str:
+        """
+        Digest of the parameters the pairs are only valid for
+        """
+        digest = hashlib.sha256(self.group.fingerprint().encode('utf-8'))
+        digest.update(self.key + self.iv)
+        return digest.hexdigest()
+
+    def matches(self, group, key: bytes, iv: bytes) -> bool:
+        """
+        Check if the pool was generated for these parameters
+        """
+        return (self.group.fingerprint(), self.key, self.iv) == (group.fingerprint(), key, iv)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _generate(self, count: int) -> List[Tuple[int, int]]:
+        return generate_encodings(count, self.group, self.key, self.iv)
+
+    def fill(self):
+        """
+        Generate pairs in the calling thread until the pool holds size pairs
+        """
+        while True:
+            missing = self.size - len(self)
+            if missing <= 0:
+                return
+            batch = self._generate(min(missing, self.batch_size))
+            with self._lock:
+                self._entries.extend(batch)
+
+    def draw(self, count: int) -> List[Tuple[int, int]]:
+        """
+        Remove and return count pairs, generating whatever the pool lacks
+        """
+        with self._lock:
+            taken = [self._entries.popleft() for _ in range(min(count, len(self._entries)))]
+            self._lock.notify_all()
+        if len(taken) < count:
+            taken.extend(self._generate(count - len(taken)))
+        return taken
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._running and len(self._entries) >= self.size:
+                    self._lock.wait()
+                if not self._running:
+                    return
+                missing = self.size - len(self._entries)
+            batch = self._generate(min(missing, self.batch_size))
+            with self._lock:
+                self._entries.extend(batch)
+
+    def start(self):
+        """
+        Keep the pool filled from a background thread
+        """
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread after its current batch
+        """
+        if self._thread is None:
+            return
+        with self._lock:
+            self._running = False
+            self._lock.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def save(self, filename: str = "encoding_pool.pkl"):
+        """
+        Persist the remaining pairs, replacing the file atomically; the
+        file is created with mode 0600
+        """
+        with self._lock:
+            state = {
+                'fingerprint': self.fingerprint(),
+                'entries': list(self._entries),
+            }
+        # The b_i are secret, so the file is readable by its owner only
+        tmp_filename = filename + ".tmp"
+        with os.fdopen(os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_filename, filename)
+
+    def load(self, filename: str = "encoding_pool.pkl"):
+        """
+        Add the pairs persisted by save, if they were made for the same
+        parameters; the file is consumed so no pair can be drawn twice
+        """
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+        if state['fingerprint'] != self.fingerprint():
+            raise ValueError("Encoding pool was generated for different parameters")
+        os.remove(filename)
+        with self._lock:
+            self._entries.extend(state['entries'])
@@ -0,0 +1,120 @@
+import secrets
+from typing import List, Sequence
+import gmpy2
+from gmpy2 import mpz
+from poly import evaluation_method, fast_multi_point_evaluation, make_subproduct_tree
+from wire import decode_elements, encode_elements
+
+# Default small interpolation prime, 29 * 2^57 + 1. Its multiplicative
+# group has a subgroup of order 2^57, so it also suits number-theoretic
+# transforms.
+DEFAULT_FIELD = 4179340454199820289
+
+
+# Statistical distance of a member's limbs from uniform is at most
+# 2^-LIMB_MARGIN_BITS, see split_limbs
+LIMB_MARGIN_BITS = 40
+
+
+def limb_count(width: int, field: int) -> int:
+    """
+    Number of limbs a buffer of width bytes is split into: base-field
+    digits enough for field^count >= 2^(8 width + LIMB_MARGIN_BITS)
+    """
+    target = mpz(1) << (8 * width + LIMB_MARGIN_BITS)
+    count, power = 0, mpz(1)
+    while power < target:
+        power *= field
+        count += 1
+    return count
+
+
+def split_limbs(buffer: bytes, field: int) -> List[mpz]:
+    """
+    Split a buffer into limbs, least significant limb first, every limb a
+    field element
+
+    The limbs are the base-field digits of V = v + 2^(8 width) t, with v
+    the buffer and t drawn uniformly among the values keeping V below
+    field^count. For a uniform buffer V is uniform in [0, field^count) up
+    to 2^-LIMB_MARGIN_BITS, so every limb is uniform in the field just
+    like the evaluation of a limb polynomial at a non-member: limbs of
+    the buffer itself would all lie below a power of two and give members
+    away.
+    """
+    width = len(buffer)
+    count = limb_count(width, field)
+    modulus = mpz(1) << (8 * width)
+    value = mpz(int.from_bytes(buffer, 'big'))
+    choices = (mpz(field) ** count - value + modulus - 1) // modulus
+    value += modulus * mpz(secrets.randbelow(int(choices)))
+    limbs = []
+    for _ in range(count):
+        value, limb = gmpy2.f_divmod(value, field)
+        limbs.append(limb)
+    return limbs
+
+
+def join_limbs(limbs: Sequence[int], width: int, field: int) -> bytes:
+    """
+    Reassemble a buffer of width bytes from its limbs: the low 8 width
+    bits of the number with the limbs as base-field digits
+    """
+    value = mpz(0)
+    for limb in reversed(limbs):
+        value = value * field + limb
+    return int(value % (mpz(1) << (8 * width))).to_bytes(width, 'big')
+
+
+def interpolate_limbs(tree, buffers: Sequence[bytes], pool=None) -> List[List[mpz]]:
+    """
+    Interpolate one polynomial per limb over the tree's field, the j-th
+    taking limb j of buffers[i] at point i. All limbs share the tree.
+    """
+    columns = zip(*[split_limbs(buffer, tree.p) for buffer in buffers])
+    return [tree.interpolate(list(column), pool) for column in columns]
+
+
+def evaluate_limbs(polys: Sequence[Sequence[int]], points: Sequence[int], field: int, width: int, pool=None) -> List[bytes]:
+    """
+    Evaluate every limb polynomial at points and reassemble one buffer of
+    width bytes per point. All limbs share one subproduct tree, built only
+    if the tree is the fastest way to evaluate them.
+    """
+    tree = None
+    if polys and evaluation_method(max(map(len, polys)), len(points), field) == 'tree':
+        tree = make_subproduct_tree(points, field)
+    columns = [fast_multi_point_evaluation(poly, points, field, tree, pool) for poly in polys]
+    return [join_limbs(limbs, width, field) for limbs in zip(*columns)]
+
+
+def finish_limbs(evaluations, width: int, pool=None) -> List[bytes]:
+    """
+    evaluate_limbs for limb polynomials streamed into one
+    StreamingEvaluation per limb, all over the same points
+    """
+    first = evaluations[0]
+    tree = make_subproduct_tree(first.points, first.p) if first.method() == 'tree' else None
+    columns = [evaluation.result(pool, tree) for evaluation in evaluations]
+    return [join_limbs(limbs, width, first.p) for limbs in zip(*columns)]
+
+
+def encode_limb_rows(polys: Sequence[Sequence[int]], field: int, start: int, stop: int) -> bytes:
+    """
+    Encode coefficients start..stop-1 of all limb polynomials row by row:
+    coefficient i of every limb, then coefficient i + 1, and so on
+    """
+    rows = []
+    for i in range(start, stop):
+        rows.extend(poly[i] if i < len(poly) else 0 for poly in polys)
+    return encode_elements(rows, field)
+
+
+def decode_limb_rows(data: bytes, field: int, count: int) -> List[List[mpz]]:
+    """
+    Decode rows of count limb coefficients, as encoded by encode_limb_rows
+    """
+    values = decode_elements(data, field)
+    if len(values) % count:
+        raise ValueError("Truncated limb row")
+    return [values[i:i + count] for i in range(0, len(values), count)]
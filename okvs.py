@@ -0,0 +1,156 @@
+import hashlib
+import secrets
+import struct
+from typing import List, Sequence
+
+# Random band matrix OKVS over GF(2): every key selects a band of
+# BAND_WIDTH columns at a random offset, and the store is the solution of
+# the banded linear system <band(key), cells> = value. With EXPANSION
+# times as many columns as keys plus one band, a random system is solvable
+# except with small probability; encode draws a new seed when it is not.
+BAND_WIDTH = 128
+EXPANSION = 1.1
+SEED_SIZE = 16
+MAX_ATTEMPTS = 8
+
+# Store header: band width and seed
+_HEADER = struct.Struct(f'!H{SEED_SIZE}s')
+
+
+def store_size(count: int, width: int = BAND_WIDTH) -> int:
+    """
+    Number of cells of a store for count keys
+    """
+    return int(count * EXPANSION) + width
+
+
+def band(item: str, seed: bytes, size: int, width: int = BAND_WIDTH):
+    """
+    (start, bits) of the band of an item: bit k of bits selects cell
+    start + k. Bit 0 is always set.
+    """
+    digest = hashlib.blake2b(item.encode('utf-8'), key=seed, digest_size=8 + width // 8).digest()
+    start = int.from_bytes(digest[:8], 'big') % (size - width + 1)
+    return start, int.from_bytes(digest[8:], 'big') | 1
+
+
+def _band_xor(cells: Sequence[int], start: int, bits: int) -> int:
+    """
+    XOR of the cells a band selects
+    """
+    value = 0
+    while bits:
+        shift = (bits & -bits).bit_length() - 1
+        start += shift
+        value ^= cells[start]
+        bits >>= shift + 1
+        start += 1
+    return value
+
+
+class BandOKVS:
+    """
+    Oblivious key-value store mapping every item of a set to a value of
+    width bytes, by a random band matrix over GF(2)
+
+    Encoding is a Gaussian elimination over the bands sorted by offset,
+    which only ever touches the BAND_WIDTH columns of a band, and decoding
+    an item is the XOR of the cells in its band. Free cells are random, so
+    the store reveals nothing about which items were encoded.
+    """
+
+    def __init__(self, items: Sequence[str], width: int = BAND_WIDTH, seed: bytes = None):
+        self.items = list(items)
+        self.width = width
+        self.size = store_size(len(self.items), width)
+        self.reseed(seed)
+
+    def reseed(self, seed: bytes = None):
+        """
+        Draw the bands of all items again under a new seed
+        """
+        self.seed = seed if seed is not None else secrets.token_bytes(SEED_SIZE)
+        self.bands = [band(item, self.seed, self.size, self.width) for item in self.items]
+
+    def _solve(self, values: Sequence[int], value_bits: int) -> List[int]:
+        """
+        Cells with every band XORing to its item's value, or None if the
+        bands are linearly dependent
+        """
+        # Forward elimination: pivots maps a column to a reduced row whose
+        # lowest bit is that column, bits relative to the column
+        pivots = {}
+        for i in sorted(range(len(self.bands)), key=lambda i: self.bands[i][0]):
+            column, bits = self.bands[i]
+            value = int(values[i])
+            while True:
+                if not bits:
+                    return None
+                shift = (bits & -bits).bit_length() - 1
+                column += shift
+                bits >>= shift
+                pivot = pivots.get(column)
+                if pivot is None:
+                    pivots[column] = (bits, value)
+                    break
+                bits ^= pivot[0]
+                value ^= pivot[1]
+
+        # Back substitution from the last column, with every free cell random
+        cells = [secrets.randbits(value_bits) for _ in range(self.size)]
+        for column in sorted(pivots, reverse=True):
+            bits, value = pivots[column]
+            cells[column] = value ^ _band_xor(cells, column + 1, bits >> 1)
+        return cells
+
+    def encode(self, values: Sequence[int], value_size: int) -> List[int]:
+        """
+        Cells of a store mapping items[i] to values[i], each below
+        2^(8 * value_size). Draws a new seed if the bands are dependent.
+        """
+        if len(values) != len(self.items):
+            raise ValueError("Number of values does not match the number of items")
+        for _ in range(MAX_ATTEMPTS):
+            cells = self._solve(values, 8 * value_size)
+            if cells is not None:
+                return cells
+            self.reseed()
+        raise ValueError(f"No solvable band matrix found in {MAX_ATTEMPTS} attempts")
+
+    def header(self) -> bytes:
+        return _HEADER.pack(self.width, self.seed)
+
+
+def encode_cells(cells: Sequence[int], value_size: int, start: int, stop: int) -> bytes:
+    """
+    Encode cells start..stop-1 as fixed-width big-endian buffers
+    """
+    return b''.join(int(cell).to_bytes(value_size, 'big') for cell in cells[start:stop])
+
+
+def decode_store(data: bytes, value_size: int):
+    """
+    (width, seed, cells) of a store sent as its header followed by the
+    encoded cells
+    """
+    if len(data) < _HEADER.size or (len(data) - _HEADER.size) % value_size:
+        raise ValueError("Truncated key-value store")
+    width, seed = _HEADER.unpack_from(data)
+    body = data[_HEADER.size:]
+    cells = [int.from_bytes(body[i:i + value_size], 'big') for i in range(0, len(body), value_size)]
+    if len(cells) < width:
+        raise ValueError("Key-value store is smaller than one band")
+    return width, seed, cells
+
+
+def decode_items(items: Sequence[str], data: bytes, value_size: int) -> List[bytes]:
+    """
+    The value_size byte value the store in data maps every item to; items
+    that were not encoded get a pseudorandom value
+    """
+    width, seed, cells = decode_store(data, value_size)
+    values = []
+    for item in items:
+        start, bits = band(item, seed, len(cells), width)
+        values.append(_band_xor(cells, start, bits).to_bytes(value_size, 'big'))
+    return values
@@ -0,0 +1,94 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+# Chunks imap_chunks keeps submitted per worker ahead of its consumer
+IN_FLIGHT_PER_WORKER = 2
+
+
+class WorkerPool:
+    """
+    Pool of worker processes for the per-element protocol work
+
+    Work is split into chunks of chunk_size items that run in parallel and
+    come back in the original order. With workers <= 1 everything runs in
+    the calling process, so the pool can always be used unconditionally.
+    Functions and arguments handed to the pool must be picklable.
+    """
+
+    def __init__(self, workers: int = 1, chunk_size: int = 256):
+        if workers < 1:
+            raise ValueError("Number of workers must be at least 1")
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def parallel(self) -> bool:
+        return self.workers > 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def map(self, fn: Callable, items: List) -> List:
+        """
+        Compute [fn(item) for item in items] with one task per item
+        """
+        items = list(items)
+        if not self.parallel or len(items) <= 1:
+            return [fn(item) for item in items]
+        return list(self._get_executor().map(fn, items))
+
+    def map_chunks(self, fn: Callable, items: List, *args) -> List:
+        """
+        Split items into chunks, compute fn(chunk, *args) for each chunk and
+        concatenate the returned lists in order
+        """
+        items = list(items)
+        if not self.parallel or len(items) <= self.chunk_size:
+            return list(fn(items, *args))
+        executor = self._get_executor()
+        futures = [executor.submit(fn, items[i:i + self.chunk_size], *args)
+                   for i in range(0, len(items), self.chunk_size)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def imap_chunks(self, fn: Callable, items: List, *args) -> Iterator[List]:
+        """
+        Like map_chunks, but yield the result of every chunk in order as
+        soon as it is available
+
+        At most IN_FLIGHT_PER_WORKER chunks per worker are submitted ahead
+        of the consumer, so results pile up only that far when it is slow.
+        """
+        items = list(items)
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        if not self.parallel or len(chunks) <= 1:
+            for chunk in chunks:
+                yield fn(chunk, *args)
+            return
+        executor = self._get_executor()
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= IN_FLIGHT_PER_WORKER * self.workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(fn, chunk, *args))
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
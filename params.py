@@ -0,0 +1,294 @@
+import json
+import os
+import secrets
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Optional, Tuple
+import gmpy2
+from gmpy2 import mpz
+
+# Safe primes p = 2q + 1 of the RFC 3526 MODP groups. The generator 2 of
+# these groups is a quadratic residue, so it generates the subgroup of
+# order q the protocol works in.
+STANDARD_GROUPS: Dict[int, int] = {
+    2048: int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+        "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+        "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+        "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+        "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+        "3995497CEA956AE515D2261898FA051015728E5A8AACAA68FFFFFFFFFFFFFFFF", 16),
+    3072: int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+        "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+        "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+        "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+        "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+        "3995497CEA956AE515D2261898FA051015728E5A8AAAC42DAD33170D04507A33"
+        "A85521ABDF1CBA64ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+        "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6BF12FFA06D98A0864"
+        "D87602733EC86A64521F2B18177B200CBBE117577A615D6C770988C0BAD946E2"
+        "08E24FA074E5AB3143DB5BFCE0FD108E4B82D120A93AD2CAFFFFFFFFFFFFFFFF", 16),
+    4096: int(
+        "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74"
+        "020BBEA63B139B22514A08798E3404DDEF9519B3CD3A431B302B0A6DF25F1437"
+        "4FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+        "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF05"
+        "98DA48361C55D39A69163FA8FD24CF5F83655D23DCA3AD961C62F356208552BB"
+        "9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+        "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF695581718"
+        "3995497CEA956AE515D2261898FA051015728E5A8AAAC42DAD33170D04507A33"
+        "A85521ABDF1CBA64ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+        "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6BF12FFA06D98A0864"
+        "D87602733EC86A64521F2B18177B200CBBE117577A615D6C770988C0BAD946E2"
+        "08E24FA074E5AB3143DB5BFCE0FD108E4B82D120A92108011A723C12A787E6D7"
+        "88719A10BDBA5B2699C327186AF4E23C1A946834B6150BDA2583E9CA2AD44CE8"
+        "DBBBC2DB04DE8EF92E8EFC141FBECAA6287C59474E6BC05D99B2964FA090C3A2"
+        "233BA186515BE7ED1F612970CEE2D7AFB81BDD762170481CD0069127D5B05AA9"
+        "93B4EA988D8FDDC186FFB7DC90A6C08F4DF435C934063199FFFFFFFFFFFFFFFF", 16),
+}
+
+# Odd primes the candidates are sieved by before any primality test
+SIEVE_BOUND = 1 << 16
+# Number of consecutive candidates q = start + 2k sieved at once
+SIEVE_WINDOW = 1 << 14
+# Windows searched by one task of a parallel search
+WINDOWS_PER_TASK = 4
+# Miller-Rabin rounds used when a group is validated
+PRIMALITY_ROUNDS = 25
+
+STORE_VERSION = 1
+DEFAULT_STORE = "group_params.json"
+
+
+def _small_primes(bound: int):
+    sieve = bytearray([1]) * bound
+    sieve[0:2] = b'\x00\x00'
+    for i in range(2, int(bound ** 0.5) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, bound, i)))
+    return [i for i in range(3, bound) if sieve[i]]
+
+
+_SMALL_PRIMES = _small_primes(SIEVE_BOUND)
+
+
+def sieve_window(start: int, window: int = SIEVE_WINDOW) -> bytearray:
+    """
+    Sieve the candidates q = start + 2k, 0 <= k < window, for an odd start
+
+    Entry k stays 1 only if neither q nor 2q + 1 has an odd prime factor
+    below SIEVE_BOUND, so both halves of the safe prime are sieved at once.
+    """
+    survivors = bytearray([1]) * window
+    for r in _SMALL_PRIMES:
+        inv2 = (r + 1) // 2
+        a = start % r
+        # q ≡ 0 (mod r)
+        k = (-a * inv2) % r
+        survivors[k::r] = bytes(len(range(k, window, r)))
+        # 2q + 1 ≡ 0 (mod r), i.e. q ≡ -1/2 (mod r)
+        k = ((-inv2 - a) * inv2) % r
+        survivors[k::r] = bytes(len(range(k, window, r)))
+    return survivors
+
+
+def _search_window(start: int, window: int = SIEVE_WINDOW) -> Optional[int]:
+    """
+    Return the first safe prime p = 2q + 1 with q in the sieved window
+    """
+    survivors = sieve_window(start, window)
+    for k in range(window):
+        if not survivors[k]:
+            continue
+        q = mpz(start + 2 * k)
+        p = 2 * q + 1
+        # Cheap Fermat test of p first, most survivors fail it
+        if gmpy2.powmod(2, p - 1, p) != 1:
+            continue
+        if gmpy2.is_prime(q, PRIMALITY_ROUNDS) and gmpy2.is_prime(p, PRIMALITY_ROUNDS):
+            return int(p)
+    return None
+
+
+def _random_start(bits: int) -> int:
+    # Odd q with its top bit set, so p = 2q + 1 has exactly bits bits
+    return secrets.randbits(bits - 1) | (1 << (bits - 2)) | 1
+
+
+def _search_task(bits: int, windows: int) -> Optional[int]:
+    for _ in range(windows):
+        start = _random_start(bits)
+        if start + 2 * SIEVE_WINDOW >= 1 << (bits - 1):
+            continue
+        p = _search_window(start)
+        if p is not None:
+            return p
+    return None
+
+
+def search_safe_prime(bits: int = 2048, workers: int = 1) -> int:
+    """
+    Find a random safe prime p = 2q + 1 of the given bit size
+
+    Windows of candidates are sieved for q and 2q + 1 together and only the
+    survivors are tested. With workers > 1 several processes search
+    independent windows and the first safe prime found is returned.
+    """
+    if bits < 32:
+        raise ValueError("Safe primes below 32 bits are not supported")
+    if workers <= 1:
+        while True:
+            p = _search_task(bits, 1)
+            if p is not None:
+                return p
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_search_task, bits, WINDOWS_PER_TASK) for _ in range(workers)}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                p = future.result()
+                if p is not None:
+                    for other in pending:
+                        other.cancel()
+                    return p
+                pending.add(executor.submit(_search_task, bits, WINDOWS_PER_TASK))
+
+
+def _non_residues(p: int, q: int):
+    k = 2
+    while True:
+        if gmpy2.powmod(k, q, p) != 1:
+            yield k
+        k += 1
+
+
+def derive_group(p: int) -> Tuple[int, int, int, int, int]:
+    """
+    Deterministically derive (p, q, h, g, u) from a safe prime p:
+    - g is 2 if it lies in the subgroup of order q, otherwise 4
+    - h is the smallest element with h^q ≠ 1 (mod p)
+    - u is the next element with u^q ≠ 1 (mod p)
+    """
+    p = int(p)
+    q = (p - 1) // 2
+    g = 2 if gmpy2.powmod(2, q, p) == 1 else 4
+    non_residues = _non_residues(p, q)
+    h = next(non_residues)
+    u = next(non_residues)
+    return p, q, h, g, u
+
+
+def validate_params(p: int, q: int, h: int, g: int, u: int) -> bool:
+    """
+    Check that p = 2q + 1 is a safe prime, g generates the subgroup of
+    order q and h and u lie outside it
+    """
+    p, q, h, g, u = (mpz(v) for v in (p, q, h, g, u))
+    if p != 2 * q + 1 or q < 3:
+        return False
+    if not (gmpy2.is_prime(q, PRIMALITY_ROUNDS) and gmpy2.is_prime(p, PRIMALITY_ROUNDS)):
+        return False
+    if not all(1 < v < p - 1 for v in (h, g, u)):
+        return False
+    if gmpy2.powmod(g, q, p) != 1:
+        return False
+    return gmpy2.powmod(h, q, p) != 1 and gmpy2.powmod(u, q, p) != 1
+
+
+def standard_group(bits: int = 2048) -> Tuple[int, int, int, int, int]:
+    """
+    (p, q, h, g, u) of the standardized safe-prime group of the given size
+    """
+    if bits not in STANDARD_GROUPS:
+        raise ValueError(f"No standardized group of {bits} bits, choose one of {sorted(STANDARD_GROUPS)}")
+    return derive_group(STANDARD_GROUPS[bits])
+
+
+def generate_params(bits: int = 2048, workers: int = 1) -> Tuple[int, int, int, int, int]:
+    """
+    Generate a fresh safe prime of the given size and derive its group
+    """
+    return derive_group(search_safe_prime(bits, workers))
+
+
+class ParameterStore:
+    """
+    On-disk cache of validated (p, q, h, g, u) tuples, one per bit size
+
+    The file is JSON with a format version; a file of another version is
+    ignored and entries are validated again whenever they are read, so a
+    corrupt or edited file can never hand out broken parameters.
+    """
+
+    def __init__(self, filename: str = DEFAULT_STORE):
+        self.filename = filename
+
+    def _read(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.filename, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if not isinstance(state, dict) or state.get('version') != STORE_VERSION:
+            return {}
+        return state.get('groups', {})
+
+    def _write(self, groups: Dict[str, Dict[str, str]]):
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'groups': groups}, f, indent=2)
+        os.replace(tmp_filename, self.filename)
+
+    def get(self, bits: int) -> Optional[Tuple[int, int, int, int, int]]:
+        """
+        Return the cached parameters of the given size, or None
+        """
+        entry = self._read().get(str(bits))
+        if entry is None:
+            return None
+        try:
+            params = tuple(int(entry[k], 16) for k in ('p', 'q', 'h', 'g', 'u'))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if int(params[0]).bit_length() != bits or not validate_params(*params):
+            return None
+        return params
+
+    def put(self, params: Tuple[int, int, int, int, int]):
+        """
+        Validate the parameters and store them under their bit size
+        """
+        if not validate_params(*params):
+            raise ValueError("Invalid group parameters")
+        groups = self._read()
+        groups[str(int(params[0]).bit_length())] = {
+            k: format(int(v), 'x') for k, v in zip(('p', 'q', 'h', 'g', 'u'), params)
+        }
+        self._write(groups)
+
+    def get_or_generate(self, bits: int = 2048, workers: int = 1) -> Tuple[int, int, int, int, int]:
+        """
+        Return the cached parameters of the given size, generating and
+        storing them first if there are none
+        """
+        params = self.get(bits)
+        if params is None:
+            params = generate_params(bits, workers)
+            self.put(params)
+        return params
+
+
+def load_params(bits: int = 2048, standard: bool = True, filename: str = DEFAULT_STORE,
+                workers: int = 1) -> Tuple[int, int, int, int, int]:
+    """
+    Return (p, q, h, g, u) for the given size: the standardized group if
+    there is one and standard is set, otherwise the cached or, failing
+    that, freshly generated parameters of the store
+    """
+    if standard and bits in STANDARD_GROUPS:
+        return standard_group(bits)
+    return ParameterStore(filename).get_or_generate(bits, workers)
@@ -2,8 +2,8 @@ import gmpy2
 from gmpy2 import mpz
 
 
-def evaluate(poly, points, p):
-    return fast_multi_point_evaluation(poly, points, p)
+def evaluate(poly, points, p, tree=None, pool=None):
+    return fast_multi_point_evaluation(poly, points, p, tree, pool)
 
 def normalize_element(x, p):
     """Normalize element to F_p"""
@@ -16,48 +16,133 @@ def normalize_element(x, p):
         return (num * den_inv) % p
     return mpz(x) % p
 
+class FieldVector(list):
+    """
+    Coefficients that are canonical residues modulo p, integers in [0, p)
+
+    The poly routines return their results as FieldVectors and skip
+    normalize_element on operands that already are one for the same p.
+    The constructor trusts its values; values from outside, e.g. off the
+    wire, go through field_vector, which checks them once.
+    """
+    __slots__ = ('p',)
+
+    def __init__(self, values=(), p=0):
+        super().__init__(values)
+        self.p = p
+
+def field_vector(values, p):
+    """
+    FieldVector of values, raising ValueError for any value outside [0, p)
+    """
+    vector = FieldVector(map(mpz, values), p)
+    if any(not 0 <= v < p for v in vector):
+        raise ValueError("Field element out of range")
+    return vector
+
+def canonical(A, p):
+    """A as canonical residues modulo p, normalized unless it already is"""
+    if isinstance(A, FieldVector) and A.p == p:
+        return A
+    return FieldVector([normalize_element(a, p) for a in A], p)
+
+# Operand size (number of coefficients of the shorter factor) from which
+# poly_mult uses Kronecker substitution instead of schoolbook
+# multiplication. GMP runs its own subquadratic algorithms on the packed
+# integers, so Karatsuba and Toom-3 written in Python never won:
+#
+#   bits  n   schoolbook  karatsuba  toom-3  kronecker   (microseconds)
+#   62    8   14          30         28      6.4
+#   62    48  403         574        753     28
+#   2048  4   26          29         26      35
+#   2048  8   101         109        109     95
+#   2048  48  3760        2314       1888    1245
+KRONECKER_THRESHOLD = 8
+
+# poly_mult has no multi-modular (CRT) backend that would reduce the
+# coefficients modulo word-size NTT primes, convolve on the NumPy engine
+# and recombine by the explicit CRT. Kronecker substitution packs the
+# whole product into one GMP multiplication, and GMP's FFT beat NumPy
+# transforms over one row per prime (about 85 primes for a 2048-bit p)
+# at every size and prime measured:
+#
+#   bits  n=32768: kronecker  crt
+#   64             77 ms      360 ms
+#   512            0.45 s     1.53 s
+#   2048           1.80 s     6.64 s
+#
+# CRT was 7-11x slower at 1024 coefficients, 3.5-7.6x slower at 8192 and
+# more than 25x slower below 1024, so no threshold would ever select it.
+# Primes small enough for the NumPy engine go through NTTSubproductTree.
+
 def poly_mult(A, B, p):
     """Multiply two polynomials in F_p[x]"""
     if not A or not B:
-        return []
+        return FieldVector([], p)
     
-    A = [normalize_element(a, p) for a in A]
-    B = [normalize_element(b, p) for b in B]
+    A = canonical(A, p)
+    B = canonical(B, p)
     
+    n = min(len(A), len(B))
+    if n >= KRONECKER_THRESHOLD:
+        result = _kronecker_mult(A, B)
+    else:
+        result = _schoolbook_mult(A, B)
+    return FieldVector([c % p for c in result], p)
+
+def _schoolbook_mult(A, B):
+    """Multiply two integer polynomials coefficient by coefficient"""
     result = [0] * (len(A) + len(B) - 1)
     for i in range(len(A)):
         for j in range(len(B)):
-            result[i + j] = (result[i + j] + A[i] * B[j]) % p
+            result[i + j] += A[i] * B[j]
     return result
 
+def _kronecker_mult(A, B):
+    """
+    Kronecker substitution: pack each operand into one big integer with
+    slots wide enough to hold any coefficient of the product, multiply
+    once with GMP and unpack the slots again.
+    """
+    bits = max(max(A).bit_length(), 1) + max(max(B).bit_length(), 1)
+    bits += min(len(A), len(B)).bit_length()
+    product = gmpy2.pack(A, bits) * gmpy2.pack(B, bits)
+    result = gmpy2.unpack(product, bits)
+    result += [0] * (len(A) + len(B) - 1 - len(result))
+    return result[:len(A) + len(B) - 1]
+
 def poly_add(A, B, p):
     """Add two polynomials in F_p[x]"""
     if not A and not B:
-        return []
+        return FieldVector([], p)
     if not A:
-        return [normalize_element(b, p) for b in B]
+        return canonical(B, p)
     if not B:
-        return [normalize_element(a, p) for a in A]
+        return canonical(A, p)
     
-    max_len = max(len(A), len(B))
-    result = [0] * max_len
-    
-    for i in range(len(A)):
-        result[i] = (result[i] + A[i]) % p
+    A = canonical(A, p)
+    B = canonical(B, p)
+    if len(A) < len(B):
+        A, B = B, A
+    result = FieldVector(A, p)
     for i in range(len(B)):
         result[i] = (result[i] + B[i]) % p
     
     return result
 
+# Quotient length from which poly_mod switches from long division to the
+# Newton-iteration remainder below.
+NEWTON_DIVISION_THRESHOLD = 16
+
 def poly_mod(A, B, p):
     """Compute A mod B in F_p[x]"""
     if not A:
-        return []
+        return FieldVector([], p)
     if not B:
         raise ValueError("Division by zero polynomial")
     
-    A = [normalize_element(a, p) for a in A]
-    B = [normalize_element(b, p) for b in B]
+    A = canonical(A, p)
+    B = FieldVector(canonical(B, p), p)
     
     # Remove leading zeros from B
     while B and B[-1] == 0:
@@ -65,7 +150,13 @@ def poly_mod(A, B, p):
     if not B:
         raise ValueError("Division by zero polynomial")
     
-    A = A[:]
+    if len(A) - len(B) + 1 >= NEWTON_DIVISION_THRESHOLD:
+        return poly_fast_mod(A, B, p)
+    
+    # Inverse of the leading coefficient is the same for every step
+    b_lead_inv = gmpy2.invert(mpz(B[-1]), p)
+    
+    A = FieldVector(A, p)
     while len(A) >= len(B):
         # Remove leading zeros from A
         while A and A[-1] == 0:
@@ -73,10 +164,7 @@ def poly_mod(A, B, p):
         if len(A) < len(B):
             break
         
-        # Get leading coefficient and its inverse
-        lead_coeff = A[-1]
-        b_lead_inv = gmpy2.invert(mpz(B[-1]), p)
-        factor = (lead_coeff * b_lead_inv) % p
+        factor = (A[-1] * b_lead_inv) % p
         
         # Subtract factor * B * x^(deg(A) - deg(B))
         offset = len(A) - len(B)
@@ -89,11 +177,108 @@ def poly_mod(A, B, p):
     
     return A
 
+def poly_reverse(A, n):
+    """Return x^(n-1) * A(1/x), i.e. the first n coefficients of A reversed"""
+    result = list(A[:n])
+    result += [0] * (n - len(result))
+    result.reverse()
+    if isinstance(A, FieldVector):
+        return FieldVector(result, A.p)
+    return result
+
+def poly_inverse_series(A, n, p, start=None):
+    """
+    Compute the power series inverse of A modulo x^n by Newton iteration
+
+    Args:
+        A: polynomial with A[0] invertible mod p
+        n: precision of the result
+        p: prime modulus
+        start: an already known inverse of A to a lower precision, which
+               the iteration continues from instead of starting over
+
+    Returns:
+        G with A * G = 1 mod x^n
+    """
+    if n <= 0:
+        return FieldVector([], p)
+    A = canonical(A, p)
+    if start:
+        G = FieldVector(start[:n], p)
+    else:
+        G = FieldVector([gmpy2.invert(mpz(A[0]), p)], p)
+    k = len(G)
+    while k < n:
+        k = min(2 * k, n)
+        # G <- G * (2 - A * G) mod x^k
+        E = poly_mult(FieldVector(A[:k], p), G, p)[:k]
+        E = FieldVector([(-e) % p for e in E], p)
+        E[0] = (E[0] + 2) % p
+        G = FieldVector(poly_mult(G, E, p)[:k], p)
+    return G
+
+def poly_fast_mod(A, B, p, B_rev_inv=None):
+    """
+    Compute A mod B in F_p[x] in O(M(n)) using the reversed quotient
+    rev(Q) = rev(A) * rev(B)^-1 mod x^(deg A - deg B + 1)
+
+    Args:
+        A, B: polynomials over the integers, reduced mod p here
+        p: prime modulus
+        B_rev_inv: optional cached inverse series of rev(B); it is
+                   extended when it is shorter than the quotient
+
+    Returns:
+        Remainder with leading zeros removed
+    """
+    # A copy, since the leading zeros are popped off it
+    A = FieldVector(canonical(A, p), p)
+    while A and A[-1] == 0:
+        A.pop()
+    db = len(B) - 1
+    quotient_len = len(A) - db
+    if quotient_len <= 0:
+        return A
+    
+    inv = B_rev_inv
+    if not inv or len(inv) < quotient_len:
+        inv = poly_inverse_series(poly_reverse(B, len(B)), quotient_len, p, start=inv)
+    
+    # The first quotient_len coefficients of rev(A) are the top ones of A
+    A_top_rev = FieldVector(A[db:][::-1], p)
+    q_rev = poly_mult(A_top_rev, FieldVector(inv[:quotient_len], p), p)[:quotient_len]
+    Q = poly_reverse(FieldVector(q_rev, p), quotient_len)
+    QB = poly_mult(Q, canonical(B, p), p)
+    
+    R = FieldVector([(A[i] - QB[i]) % p for i in range(db)], p)
+    while R and R[-1] == 0:
+        R.pop()
+    return R
+
+def precompute_inverse_tree(tree, p):
+    """
+    Precompute the inverse series of every reversed node of a subproduct
+    tree, to the precision the remainder descent will ask of it.
+
+    A node is only ever divided into the remainder modulo its parent, so
+    the quotient has at most deg(parent) - deg(node) terms. The root is
+    left as None; its precision depends on the polynomial evaluated.
+    """
+    inverses = [[None] * len(level) for level in tree]
+    for level_idx in range(len(tree) - 1):
+        level = tree[level_idx]
+        parents = tree[level_idx + 1]
+        for i, node in enumerate(level):
+            precision = len(parents[i // 2]) - len(node)
+            if precision > 0:
+                inverses[level_idx][i] = poly_inverse_series(poly_reverse(node, len(node)), precision, p)
+    return inverses
+
 def poly_derivative(A, p):
     """Compute derivative of polynomial A"""
     if len(A) <= 1:
-        return []
-    return [(i * A[i]) % p for i in range(1, len(A))]
+        return FieldVector([], p)
+    return FieldVector([(i * A[i]) % p for i in range(1, len(A))], p)
 
 def evaluate_poly(poly, x, p):
     """Evaluate polynomial at point x using Horner's method"""
@@ -104,6 +289,30 @@ def evaluate_poly(poly, x, p):
         result = (result * x + coeff) % p
     return result
 
+# Block length of evaluate_poly_batch
+EVALUATION_BLOCK = 64
+
+def evaluate_poly_batch(poly, points, p, block=EVALUATION_BLOCK):
+    """
+    Evaluate polynomial at every point by Horner's method on blocks of
+    coefficients: f(x) = sum of f_j(x) * x^(j * block), with every block
+    f_j evaluated as one unreduced dot product with the powers of x
+    below x^block, shared by all blocks
+    """
+    blocks = [poly[i:i + block] for i in range(0, len(poly), block)]
+    results = []
+    for x in points:
+        x = mpz(x) % p
+        powers = [mpz(1)]
+        for _ in range(min(block, len(poly)) - 1):
+            powers.append(powers[-1] * x % p)
+        step = powers[-1] * x % p
+        result = mpz(0)
+        for chunk in reversed(blocks):
+            result = (result * step + sum(map(mpz.__mul__, powers, chunk))) % p
+        results.append(result)
+    return results
+
 def build_subproduct_tree(points, p):
     """Build subproduct tree for points"""
     if not points:
@@ -111,7 +320,7 @@ def build_subproduct_tree(points, p):
     
     tree = []
     # Base level: (x - point) polynomials
-    level = [[-normalize_element(point, p), 1] for point in points]
+    level = [FieldVector([-normalize_element(point, p) % p, mpz(1)], p) for point in points]
     tree.append(level)
     
     while len(level) > 1:
@@ -127,58 +336,450 @@ def build_subproduct_tree(points, p):
     
     return tree
 
-def fast_multi_point_evaluation(poly, points, p):
-    """Evaluate polynomial at multiple points using subproduct tree"""
-    if not points:
-        return []
-    if not poly:
-        return [0] * len(points)
-    
-    # For small cases, use direct evaluation
-    if len(points) <= 4:
-        return [evaluate_poly(poly, x, p) for x in points]
-    
-    # Build subproduct tree
-    tree = build_subproduct_tree(points, p)
-    if not tree:
-        return [evaluate_poly(poly, x, p) for x in points]
-    
-    # Start with the polynomial at the root
-    remainders = [poly]
-    
-    # Traverse tree from top to bottom, computing remainders
-    for level_idx in range(len(tree) - 1, 0, -1):
-        new_remainders = []
-        remainder_idx = 0
+# Fewest points for which SubproductTree splits work across a WorkerPool
+PARALLEL_MIN_POINTS = 256
+
+class SubproductTree:
+    """
+    Subproduct tree over a fixed set of points, reusable for any number of
+    evaluations and interpolations over those points.
+
+    Attributes:
+        points: the points x_i
+        p: prime modulus
+        levels: tree levels as returned by build_subproduct_tree
+        inverses: inverse series of the reversed nodes, see precompute_inverse_tree
+    """
+
+    def __init__(self, points, p):
+        self.points = list(points)
+        self.p = p
+        self.levels = build_subproduct_tree(self.points, p)
+        self.inverses = precompute_inverse_tree(self.levels, p)
+        self._derivative_values = None
+        self._derivative_inverses = None
+
+    def __len__(self):
+        return len(self.points)
+
+    @property
+    def master(self):
+        """Master polynomial M(x) = product of (x - x_i)"""
+        return self.levels[-1][0] if self.levels else [1]
+
+    @property
+    def derivative_values(self):
+        """M'(x_i) for every point, computed on first use"""
+        if self._derivative_values is None:
+            self._derivative_values = self.evaluate(poly_derivative(self.master, self.p))
+        return self._derivative_values
+
+    @property
+    def derivative_inverses(self):
+        """1 / M'(x_i) mod p for every point, computed on first use"""
+        if self._derivative_inverses is None:
+            inverses = []
+            for x, d in zip(self.points, self.derivative_values):
+                if d == 0:
+                    raise ValueError(f"Derivative is zero at point {x}, points might not be distinct")
+                inverses.append(gmpy2.invert(mpz(d), self.p))
+            self._derivative_inverses = inverses
+        return self._derivative_inverses
+
+    def precompute(self):
+        """
+        Compute the derivative inverses now instead of on first use, so
+        the tree is complete before it is shared or saved
+        """
+        self.derivative_inverses
+        return self
+
+    def subtree(self, level, index):
+        """
+        The subtree rooted at node index of the given level, covering the
+        points index * 2^level up to (index + 1) * 2^level
+        """
+        sub = SubproductTree.__new__(SubproductTree)
+        sub.p = self.p
+        first, last = index << level, (index + 1) << level
+        sub.points = self.points[first:last]
+        sub.levels = []
+        sub.inverses = []
+        for k in range(level + 1):
+            lo, hi = index << (level - k), (index + 1) << (level - k)
+            sub.levels.append(self.levels[k][lo:hi])
+            sub.inverses.append(self.inverses[k][lo:hi])
+        sub._derivative_values = None
+        sub._derivative_inverses = None
+        return sub
+
+    def node(self, level, index):
+        """Node index of the given level, a monic polynomial"""
+        return self.levels[level][index]
+
+    def update(self, changes, length):
+        """
+        Move the tree to new points in place: point i becomes changes[i]
+        for every slot i in changes, and points from length on are
+        dropped. Slots from the old number of points up to length must all
+        be in changes.
+
+        Only the nodes above a changed or dropped slot are multiplied
+        again, together with their inverse series, and derivative
+        inverses already computed are updated, see
+        update_derivative_inverses.
+        """
+        p = self.p
+        old_points = self.points
+        points = old_points[:length] + [None] * (length - len(old_points))
+        for i, x in changes.items():
+            points[i] = x
+        if None in points:
+            raise ValueError("Every new slot needs a point")
+        self.points = points
+        if not points:
+            self.levels, self.inverses = [], []
+            self._derivative_values = self._derivative_inverses = None
+            return
+
+        # Level by level, the nodes above a dirty node of the level below
+        # are recomputed; dirty includes the dropped slots, whose parents
+        # lose a child
+        level = self.levels[0][:length] if self.levels else []
+        level += [None] * (length - len(level))
+        for i, x in changes.items():
+            level[i] = FieldVector([-normalize_element(x, p) % p, mpz(1)], p)
+        levels, dirty = [level], [set(changes) | set(range(length, len(old_points)))]
+        while len(level) > 1:
+            old = self.levels[len(levels)] if len(levels) < len(self.levels) else []
+            children, level = level, list(old[:(len(level) + 1) // 2])
+            level += [None] * ((len(children) + 1) // 2 - len(level))
+            parents = {i >> 1 for i in dirty[-1]}
+            for i in range(len(level)):
+                if i in parents or level[i] is None:
+                    if 2 * i + 1 < len(children):
+                        level[i] = poly_mult(children[2 * i], children[2 * i + 1], p)
+                    else:
+                        level[i] = children[2 * i]
+            levels.append(level)
+            dirty.append(parents)
+
+        # A node's inverse series depends on it and on its parent's degree
+        inverses = []
+        for level_idx, level in enumerate(levels):
+            old = self.inverses[level_idx] if level_idx < len(self.inverses) else []
+            row = list(old[:len(level)]) + [None] * (len(level) - len(old))
+            if level_idx == len(levels) - 1:
+                row = [None]
+            else:
+                stale = dirty[level_idx] | {c for i in dirty[level_idx + 1] for c in (2 * i, 2 * i + 1)}
+                parents = levels[level_idx + 1]
+                for i in stale:
+                    if i < len(level):
+                        precision = len(parents[i // 2]) - len(level[i])
+                        row[i] = poly_inverse_series(poly_reverse(level[i], len(level[i])), precision, p) if precision > 0 else None
+            inverses.append(row)
+        self.levels, self.inverses = levels, inverses
+        self._derivative_values = None
+        self._derivative_inverses = update_derivative_inverses(self, old_points, self._derivative_inverses)
+
+    def _split_level(self, pool):
+        """
+        Highest tree level with at least one node per worker, or None when
+        the tree is too small to be worth splitting across processes
+        """
+        if pool is None or not pool.parallel or len(self.points) < PARALLEL_MIN_POINTS:
+            return None
+        for level_idx in range(len(self.levels) - 1, 0, -1):
+            if len(self.levels[level_idx]) >= pool.workers:
+                return level_idx
+        return None
+
+    def _descend(self, remainders, top, bottom):
+        """
+        Turn the remainders at level top into the remainders modulo every
+        node of level bottom
+        """
+        p = self.p
+        tree = self.levels
+        inverses = self.inverses
         
-        for i in range(0, len(tree[level_idx - 1]), 2):
-            if remainder_idx >= len(remainders):
-                break
+        # Traverse tree from top to bottom, computing remainders
+        for level_idx in range(top, bottom, -1):
+            new_remainders = []
+            remainder_idx = 0
             
-            current_remainder = remainders[remainder_idx]
-            remainder_idx += 1
+            for i in range(0, len(tree[level_idx - 1]), 2):
+                if remainder_idx >= len(remainders):
+                    break
+                
+                current_remainder = remainders[remainder_idx]
+                remainder_idx += 1
+                
+                # Left child remainder
+                left_remainder = poly_fast_mod(current_remainder, tree[level_idx - 1][i], p, inverses[level_idx - 1][i])
+                new_remainders.append(left_remainder)
+                
+                # Right child remainder (if exists)
+                if i + 1 < len(tree[level_idx - 1]):
+                    right_remainder = poly_fast_mod(current_remainder, tree[level_idx - 1][i + 1], p, inverses[level_idx - 1][i + 1])
+                    new_remainders.append(right_remainder)
             
-            # Left child remainder
-            left_remainder = poly_mod(current_remainder, tree[level_idx - 1][i], p)
-            new_remainders.append(left_remainder)
-            
-            # Right child remainder (if exists)
-            if i + 1 < len(tree[level_idx - 1]):
-                right_remainder = poly_mod(current_remainder, tree[level_idx - 1][i + 1], p)
-                new_remainders.append(right_remainder)
+            remainders = new_remainders
+        return remainders
+
+    def evaluate(self, poly, pool=None):
+        """
+        Evaluate polynomial at all points of the tree
+
+        With a WorkerPool the descent below the split level runs on the
+        subtrees in parallel.
+        """
+        p = self.p
+        if not self.points:
+            return []
+        if not poly:
+            return [0] * len(self.points)
         
-        remainders = new_remainders
-    
-    # Evaluate final remainders at corresponding points
-    results = []
-    for i, point in enumerate(points):
-        if i < len(remainders):
-            val = evaluate_poly(remainders[i], point, p)
+        # For small cases, use direct evaluation
+        if len(self.points) <= 4:
+            return [evaluate_poly(poly, x, p) for x in self.points]
+        
+        # Start with the polynomial reduced modulo the root
+        poly = canonical(poly, p)
+        remainders = [poly_fast_mod(poly, self.levels[-1][0], p)]
+        
+        split = self._split_level(pool)
+        if split is not None:
+            remainders = self._descend(remainders, len(self.levels) - 1, split)
+            tasks = [(self.subtree(split, i), r) for i, r in enumerate(remainders)]
+            results = []
+            for values in pool.map(_evaluate_subtree, tasks):
+                results.extend(values)
+            return results
+        
+        remainders = self._descend(remainders, len(self.levels) - 1, 0)
+        
+        # Evaluate final remainders at corresponding points
+        results = []
+        for i, point in enumerate(self.points):
+            if i < len(remainders):
+                val = evaluate_poly(remainders[i], point, p)
+            else:
+                val = evaluate_poly(poly, point, p)
+            results.append(val)
+        
+        return results
+
+    def interpolate(self, values, pool=None):
+        """
+        Interpolate the polynomial taking values[i] at points[i]
+
+        With a WorkerPool the subtrees below the split level are
+        interpolated in parallel and combined in this process.
+        """
+        p = self.p
+        n = len(self.points)
+        if len(values) != n:
+            raise ValueError("Number of values does not match the number of points")
+        if n == 0:
+            return []
+        if n == 1:
+            return FieldVector([mpz(values[0]) % p], p)
+        
+        # Compute c_i = y_i / M'(x_i) mod p
+        scaled_values = [(y * inv_deriv) % p for y, inv_deriv in zip(values, self.derivative_inverses)]
+        
+        split = self._split_level(pool)
+        if split is not None:
+            size = 1 << split
+            tasks = [(self.subtree(split, i), scaled_values[i * size:(i + 1) * size])
+                     for i in range(len(self.levels[split]))]
+            partials = pool.map(_interpolate_subtree, tasks)
+            result = combine_interpolation(self.levels, partials, split, p)
         else:
-            val = evaluate_poly(poly, point, p)
-        results.append(val)
-    
-    return results
+            # Reconstruct interpolation polynomial using recursive approach
+            result = interpolate_recursive(self.levels, scaled_values, len(self.levels) - 1, 0, p)
+        
+        # Remove trailing zeros
+        while result and result[-1] == 0:
+            result.pop()
+        
+        return result
+
+def _evaluate_subtree(task):
+    """Worker entry point: evaluate a remainder on a subtree"""
+    subtree, remainder = task
+    return subtree.evaluate(remainder)
+
+def _interpolate_subtree(task):
+    """Worker entry point: interpolation polynomial of a subtree's scaled values"""
+    subtree, scaled_values = task
+    return interpolate_recursive(subtree.levels, scaled_values, len(subtree.levels) - 1, 0, subtree.p)
+
+def combine_interpolation(tree, partials, level, p):
+    """
+    Combine the interpolation polynomials of the nodes at one level into
+    the one of the root, the same way interpolate_recursive combines the
+    two children of a node
+    """
+    while level < len(tree) - 1:
+        children = tree[level]
+        combined = []
+        for i in range(0, len(partials), 2):
+            if i + 1 < len(partials):
+                left = poly_mult(partials[i], children[i + 1], p)
+                right = poly_mult(partials[i + 1], children[i], p)
+                combined.append(poly_add(left, right, p))
+            else:
+                combined.append(partials[i])
+        partials = combined
+        level += 1
+    return partials[0]
+
+# Cost model of update_derivative_inverses, in Horner steps per point:
+# updating the inverses costs one per removed point plus two per added
+# point, evaluating M' through an existing tree of n points about
+# DERIVATIVE_TREE_COST * log^2 n. Measured at 1024 to 65536 points with
+# 2048-bit primes and, for the NumPy engine, with 29 * 2^57 + 1.
+DERIVATIVE_TREE_COST = 2
+NTT_DERIVATIVE_TREE_COST = 0.2
+
+def update_derivative_inverses(tree, old_points, old_inverses):
+    """
+    1 / M'(x_i) for the points of a tree that was just updated from
+    old_points, from the inverses old_inverses of the old tree, or None
+    when there are none to update
+
+    With R the product of (x - r) over the removed points and A over the
+    added ones, M' at a point kept is the old one times A / R there, so a
+    kept point costs evaluating R and A, and an added point evaluating
+    M'. Past the break-even of the cost model above, evaluating M' at
+    every point through the tree is cheaper, so None is returned and the
+    inverses are computed again on first use.
+    """
+    if old_inverses is None:
+        return None
+    p = tree.p
+    old_index = {x: i for i, x in enumerate(old_points)}
+    new_points = set(tree.points)
+    removed = [x for x in old_points if x not in new_points]
+    added = [x for x in tree.points if x not in old_index]
+    factor = NTT_DERIVATIVE_TREE_COST if isinstance(tree, NTTSubproductTree) else DERIVATIVE_TREE_COST
+    if len(removed) + 2 * len(added) + 2 > factor * len(tree).bit_length() ** 2:
+        return None
+    kept = [x for x in tree.points if x in old_index]
+    R = build_subproduct_tree(removed, p)[-1][0] if removed else [1]
+    A = build_subproduct_tree(added, p)[-1][0] if added else [1]
+    ratios = {x: r * gmpy2.invert(mpz(a), p) % p
+              for x, r, a in zip(kept, fast_multi_point_evaluation(R, kept, p), fast_multi_point_evaluation(A, kept, p))}
+    derivative = fast_multi_point_evaluation(poly_derivative(tree.master, p), added, p)
+    added_inverses = {}
+    for x, d in zip(added, derivative):
+        if d == 0:
+            raise ValueError(f"Derivative is zero at point {x}, points might not be distinct")
+        added_inverses[x] = gmpy2.invert(mpz(d), p)
+    return [old_inverses[old_index[x]] * ratios[x] % p if x in ratios else added_inverses[x]
+            for x in tree.points]
+
+# Cost model of fast_multi_point_evaluation, in multiply-adds of blocked
+# Horner: evaluating through the tree costs about EVALUATION_TREE_COST of
+# them per d log d for reducing the polynomial of d coefficients modulo
+# the root, plus per n log^2 n for the descent to the n points. Measured
+# with 2048-bit primes and, for the NumPy engine, with 29 * 2^57 + 1.
+EVALUATION_TREE_COST = 10
+NTT_EVALUATION_TREE_COST = 4
+
+def evaluation_method(length, count, p):
+    """
+    'horner', 'batched' or 'tree', the method the cost model expects to
+    evaluate a polynomial of length coefficients at count points fastest
+    """
+    direct = 'horner' if length <= EVALUATION_BLOCK else 'batched'
+    if count <= 1:
+        return direct
+    factor = NTT_EVALUATION_TREE_COST if ntt_supported(p, max(length, count)) else EVALUATION_TREE_COST
+    log_length, log_count = max(length, 2).bit_length(), count.bit_length()
+    tree_cost = factor * (length * log_length + count * log_count * log_count)
+    return 'tree' if count * length > tree_cost else direct
+
+def fast_multi_point_evaluation(poly, points, p, tree=None, pool=None):
+    """
+    Evaluate polynomial at multiple points by Horner's method, blocked
+    Horner or a subproduct tree, as evaluation_method picks
+
+    An existing SubproductTree over the same points can be passed in to
+    skip building it again, and a WorkerPool to descend its subtrees in
+    parallel. Both are hints, used only when the tree is picked, so build
+    a tree up front only when evaluation_method returns 'tree'.
+    """
+    if not points:
+        return []
+    if not poly:
+        return [0] * len(points)
+    method = evaluation_method(len(poly), len(points), p)
+    if method == 'horner':
+        return [evaluate_poly(poly, x, p) for x in points]
+    if method == 'batched':
+        return evaluate_poly_batch(poly, points, p)
+    if tree is None:
+        tree = make_subproduct_tree(points, p)
+    return tree.evaluate(poly, pool)
+
+# Coefficients a StreamingEvaluation collects before it evaluates them,
+# so the powers of every point below x^EVALUATION_BLOCK are computed once
+# per this many coefficients rather than once per received chunk
+STREAM_EVALUATION_LENGTH = 16 * EVALUATION_BLOCK
+
+class StreamingEvaluation:
+    """
+    Evaluate a polynomial at fixed points while its coefficients arrive,
+    lowest first, so evaluation overlaps the transfer
+
+    As long as evaluation_method picks Horner or blocked Horner for the
+    coefficients received so far, every STREAM_EVALUATION_LENGTH of them
+    are evaluated by evaluate_poly_batch and added in, scaled by x^start.
+    result evaluates the rest, or the whole polynomial through a
+    subproduct tree if the tree wins for its final length.
+    """
+
+    def __init__(self, points, p):
+        self.points = [mpz(x) % p for x in points]
+        self.p = p
+        self.coefficients = FieldVector([], p)
+        self._values = [mpz(0)] * len(self.points)
+        self._scales = [mpz(1)] * len(self.points)
+        self._done = 0
+
+    def method(self):
+        """The method evaluation_method picks for the coefficients so far"""
+        return evaluation_method(len(self.coefficients), len(self.points), self.p)
+
+    def extend(self, coefficients):
+        """Add the next coefficients, already reduced mod p"""
+        self.coefficients.extend(coefficients)
+        if len(self.coefficients) - self._done >= STREAM_EVALUATION_LENGTH and self.method() != 'tree':
+            self._accumulate()
+
+    def _accumulate(self):
+        p = self.p
+        part = self.coefficients[self._done:]
+        length = len(part)
+        for i, (x, value) in enumerate(zip(self.points, evaluate_poly_batch(part, self.points, p))):
+            self._values[i] = (self._values[i] + self._scales[i] * value) % p
+            self._scales[i] = self._scales[i] * gmpy2.powmod(x, length, p) % p
+        self._done += length
+
+    def result(self, pool=None, tree=None):
+        """
+        The values at all points, once every coefficient arrived; tree and
+        pool are hints as for fast_multi_point_evaluation
+        """
+        if self.method() == 'tree':
+            return fast_multi_point_evaluation(self.coefficients, self.points, self.p, tree, pool)
+        if self._done < len(self.coefficients):
+            self._accumulate()
+        return list(self._values)
 
 def interpolate_recursive(tree, values, level, index, p):
     """
@@ -197,9 +798,9 @@ def interpolate_recursive(tree, values, level, index, p):
     # Base case: at leaf level
     if level == 0:
         if index < len(values):
-            return [values[index] % p]
+            return FieldVector([values[index] % p], p)
         else:
-            return [0]
+            return FieldVector([mpz(0)], p)
     
     # Recursive case: combine left and right subtrees
     left_idx = index * 2
@@ -224,7 +825,7 @@ def interpolate_recursive(tree, values, level, index, p):
     
     return result
 
-def fast_modular_interpolation(x, y, p):
+def fast_modular_interpolation(x, y, p, tree=None, pool=None):
     """
     Fast polynomial interpolation using subproduct tree approach
     Complexity: O(n log² n) operations in the field
@@ -233,10 +834,15 @@ def fast_modular_interpolation(x, y, p):
         x: list of x coordinates (must be distinct)
         y: list of y coordinates  
         p: prime modulus for finite field operations
+        tree: optional SubproductTree already built over x
+        pool: optional WorkerPool to interpolate subtrees in parallel
     
     Returns:
         Polynomial coefficients [a0, a1, ..., an] representing interpolating polynomial
     """
+    if tree is not None:
+        return tree.interpolate(y, pool)
+    
     n = len(x)
     if n == 0:
         return []
@@ -247,35 +853,572 @@ def fast_modular_interpolation(x, y, p):
     if len(set(x)) != len(x):
         raise ValueError("Points must be distinct for interpolation")
     
-    # Step 1: Build subproduct tree
-    tree = build_subproduct_tree(x, p)
-    if not tree:
-        return [y[0] % p]
-    
-    # Step 2: Get master polynomial M(x) = product of (x - x_i)
-    master_poly = tree[-1][0]
-    
-    # Step 3: Compute derivative M'(x)
-    master_deriv = poly_derivative(master_poly, p)
-    
-    # Step 4: Evaluate M'(x_i) for all points using fast multipoint evaluation
-    deriv_values = fast_multi_point_evaluation(master_deriv, x, p)
-    
-    # Step 5: Compute c_i = y_i / M'(x_i) mod p
-    scaled_values = []
-    for i in range(n):
-        if deriv_values[i] == 0:
-            raise ValueError(f"Derivative is zero at point {x[i]}, points might not be distinct")
-        
-        inv_deriv = gmpy2.invert(mpz(deriv_values[i]), p)
-        c_i = (y[i] * inv_deriv) % p
-        scaled_values.append(c_i)
-    
-    # Step 6: Reconstruct interpolation polynomial using recursive approach
-    result = interpolate_recursive(tree, scaled_values, len(tree) - 1, 0, p)
-    
-    # Remove trailing zeros
-    while result and result[-1] == 0:
-        result.pop()
-    
-    return result
+    return make_subproduct_tree(x, p).interpolate(y, pool)
+
+
+# ---------------------------------------------------------------------------
+# NumPy engine for NTT-friendly primes p = c * 2^k + 1 below 2^62
+#
+# Coefficients live in uint64 arrays and all the nodes of one tree level are
+# processed together as the rows of a 2D array, so the Python overhead is
+# paid per level instead of per node. Products modulo p are reduced with a
+# floating-point quotient: float64 is exact enough below 2^50, above that a
+# long double with a 64-bit mantissa is needed. The list-of-mpz code above
+# remains the generic fallback for every other prime.
+# ---------------------------------------------------------------------------
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None and np.finfo(np.longdouble).nmant >= 63:
+    NTT_MAX_PRIME = 1 << 62
+else:
+    NTT_MAX_PRIME = 1 << 50
+
+# Row lengths at which NTTField.mult switches strategy: products with a
+# factor of at most NTT_SCHOOLBOOK_LENGTH coefficients are done by a
+# vectorised schoolbook loop, products of at least NTT_KRONECKER_LENGTH
+# coefficients row by row by Kronecker substitution, where GMP's own FFT
+# multiplication catches up with a NumPy NTT that no longer fits in cache.
+# Everything in between is a batched NTT.
+NTT_SCHOOLBOOK_LENGTH = 8
+NTT_KRONECKER_LENGTH = 1 << 18
+
+
+class NTTField:
+    """
+    Vectorised arithmetic modulo an NTT-friendly prime p on uint64 arrays
+
+    Attributes:
+        p: the prime
+        two_adicity: the largest k with 2^k dividing p - 1, i.e. the
+            longest supported transform is 2^k
+    """
+
+    def __init__(self, p):
+        p = int(p)
+        self.p = p
+        self.two_adicity = ((p - 1) & -(p - 1)).bit_length() - 1
+        # Any quadratic non-residue raised to the odd part of p - 1 has
+        # order exactly 2^two_adicity
+        x = 2
+        while pow(x, (p - 1) // 2, p) != p - 1:
+            x += 1
+        self.root = pow(x, (p - 1) >> self.two_adicity, p)
+        self._P = np.uint64(p)
+        self._Pi = np.int64(p)
+        self._float = np.float64 if p < 1 << 50 else np.longdouble
+        self._inv_p = self._float(1) / self._float(p)
+        self._twiddles = {}
+
+    def array(self, values):
+        """Coefficients reduced mod p as a uint64 array"""
+        p = self.p
+        return np.array([int(v) % p for v in values], dtype=np.uint64)
+
+    def _reduce(self, r):
+        # r = a * b - q * p with q off by at most one, i.e. r in [-p, 2p)
+        r = r.view(np.int64)
+        r = r + ((r >> 63) & self._Pi) - self._Pi
+        r = r + ((r >> 63) & self._Pi)
+        return r.view(np.uint64)
+
+    def mul(self, a, b):
+        """a * b mod p elementwise, with broadcasting"""
+        if self.p < 1 << 32:
+            return a * b % self._P
+        q = (a.astype(self._float) * b.astype(self._float) * self._inv_p).astype(np.uint64)
+        return self._reduce(a * b - q * self._P)
+
+    def mul_const(self, a, b, b_quotient):
+        """a * b mod p for a fixed b with b_quotient = b / p precomputed"""
+        if self.p < 1 << 32:
+            return a * b % self._P
+        q = (a.astype(self._float) * b_quotient).astype(np.uint64)
+        return self._reduce(a * b - q * self._P)
+
+    def add(self, a, b):
+        s = (a + b).view(np.int64) - self._Pi
+        return (s + ((s >> 63) & self._Pi)).view(np.uint64)
+
+    def sub(self, a, b):
+        s = (a - b).view(np.int64)
+        return (s + ((s >> 63) & self._Pi)).view(np.uint64)
+
+    def neg(self, a):
+        return self.sub(np.zeros_like(a), a)
+
+    def _get_twiddles(self, n, inverse):
+        """Powers w^j, j < n/2, of a primitive n-th root of unity w (or of 1/w)"""
+        key = (n, inverse)
+        if key not in self._twiddles:
+            p = self.p
+            if n.bit_length() - 1 > self.two_adicity:
+                raise ValueError(f"Transform of length {n} is not supported modulo {p}")
+            w = pow(self.root, 1 << (self.two_adicity - n.bit_length() + 1), p)
+            if inverse:
+                w = pow(w, p - 2, p)
+            powers = np.ones(max(n // 2, 1), dtype=np.uint64)
+            filled = 1
+            while filled < n // 2:
+                step = min(filled, n // 2 - filled)
+                w_filled = np.uint64(pow(w, filled, p))
+                powers[filled:filled + step] = self.mul(powers[:step], w_filled)
+                filled += step
+            self._twiddles[key] = (powers, powers.astype(self._float) * self._inv_p)
+        return self._twiddles[key]
+
+    def ntt(self, x):
+        """
+        Forward transform of every row of x (length a power of two), by
+        decimation in frequency; the output is in bit-reversed order
+        """
+        rows, n = x.shape
+        powers, quotients = self._get_twiddles(n, False)
+        x = x.copy()
+        m = n
+        while m >= 2:
+            h = m // 2
+            blocks = x.reshape(rows, n // m, 2, h)
+            u = blocks[:, :, 0, :]
+            v = blocks[:, :, 1, :]
+            total = self.add(u, v)
+            difference = self.mul_const(self.sub(u, v), powers[::n // m], quotients[::n // m])
+            blocks[:, :, 0, :] = total
+            blocks[:, :, 1, :] = difference
+            m = h
+        return x
+
+    def intt(self, x):
+        """
+        Inverse transform of every row of x from bit-reversed order, by
+        decimation in time; the output is in natural order
+        """
+        rows, n = x.shape
+        powers, quotients = self._get_twiddles(n, True)
+        x = x.copy()
+        m = 2
+        while m <= n:
+            h = m // 2
+            blocks = x.reshape(rows, n // m, 2, h)
+            u = blocks[:, :, 0, :]
+            v = self.mul_const(blocks[:, :, 1, :], powers[::n // m], quotients[::n // m])
+            total = self.add(u, v)
+            blocks[:, :, 1, :] = self.sub(u, v)
+            blocks[:, :, 0, :] = total
+            m *= 2
+        n_inv = pow(n, self.p - 2, self.p)
+        return self.mul(x, np.uint64(n_inv))
+
+    def mult(self, A, B):
+        """
+        Row-wise products of two batches of polynomials, A of shape
+        (rows, la) and B of shape (rows, lb), as a (rows, la + lb - 1) array
+        """
+        return self.middle_product(A, B, 0, A.shape[1] + B.shape[1] - 1)
+
+    def middle_product(self, A, B, start, length):
+        """
+        Coefficients start to start + length - 1 of the row-wise products
+        A * B. The NTT only has to be long enough for the wrapped-around
+        part of a cyclic convolution to stay below start.
+        """
+        rows, la = A.shape
+        lb = B.shape[1]
+        if la < lb:
+            A, B, la, lb = B, A, lb, la
+        full_length = la + lb - 1
+        if lb <= NTT_SCHOOLBOOK_LENGTH:
+            result = np.zeros((rows, full_length), dtype=np.uint64)
+            for j in range(lb):
+                result[:, j:j + la] = self.add(result[:, j:j + la], self.mul(A, B[:, j:j + 1]))
+            return _pad_columns(result[:, start:], length)
+        if lb >= NTT_KRONECKER_LENGTH:
+            p = self.p
+            result = np.empty((rows, full_length), dtype=np.uint64)
+            for i in range(rows):
+                product = _kronecker_mult(A[i].tolist(), B[i].tolist())
+                result[i] = [int(c) % p for c in product]
+            return _pad_columns(result[:, start:], length)
+        n = 1 << (max(start + length, full_length - start) - 1).bit_length()
+        padded_A = np.zeros((rows, n), dtype=np.uint64)
+        padded_A[:, :la] = A
+        padded_B = np.zeros((rows, n), dtype=np.uint64)
+        padded_B[:, :lb] = B
+        product = self.intt(self.mul(self.ntt(padded_A), self.ntt(padded_B)))
+        return _pad_columns(product[:, start:start + length], length)
+
+    def monic_mult(self, A, B):
+        """
+        Row-wise products of monic polynomials given without their leading
+        1: (x^da + A)(x^db + B) = x^(da+db) + AB + x^db A + x^da B
+        """
+        rows, da = A.shape
+        db = B.shape[1]
+        result = np.zeros((rows, da + db), dtype=np.uint64)
+        result[:, :da + db - 1] = self.mult(A, B)
+        result[:, db:] = self.add(result[:, db:], A)
+        result[:, da:] = self.add(result[:, da:], B)
+        return result
+
+    def inverse_series(self, A, n):
+        """
+        Row-wise power series inverses modulo x^n of A, whose constant
+        coefficients must all be 1, by Newton iteration
+        """
+        rows = A.shape[0]
+        if A.shape[1] < n:
+            A = np.concatenate([A, np.zeros((rows, n - A.shape[1]), dtype=np.uint64)], axis=1)
+        G = np.ones((rows, 1), dtype=np.uint64)
+        k = 1
+        while k < n:
+            k = min(2 * k, n)
+            # G <- G * (2 - A * G) mod x^k
+            E = self.neg(self.mult(A[:, :k], G)[:, :k])
+            E[:, 0] = self.add(E[:, 0], np.uint64(2))
+            G = self.mult(G, E)[:, :k]
+        return G
+
+    def monic_mod(self, R, M, M_rev_inv):
+        """
+        Row-wise remainders of R (rows, L) modulo the monic polynomials
+        x^d + M, M of shape (rows, d), given the inverse series of their
+        reversals to precision at least L - d
+        """
+        d = M.shape[1]
+        quotient_len = R.shape[1] - d
+        if quotient_len <= 0:
+            return R
+        # rev(Q) = rev(R) * rev(x^d + M)^-1 mod x^(L - d)
+        q_rev = self.mult(R[:, :d - 1:-1], M_rev_inv[:, :quotient_len])[:, :quotient_len]
+        QM = self.mult(q_rev[:, ::-1], M)[:, :d]
+        return self.sub(R[:, :d], QM)
+
+
+_ntt_fields = {}
+
+def ntt_field(p):
+    """NTTField for p, shared by everything working modulo p in this process"""
+    field = _ntt_fields.get(int(p))
+    if field is None:
+        field = _ntt_fields[int(p)] = NTTField(p)
+    return field
+
+def ntt_supported(p, size=1):
+    """
+    Check if the NumPy engine can work modulo p on polynomials of up to
+    size coefficients
+    """
+    if np is None or not 2 < p < NTT_MAX_PRIME or not gmpy2.is_prime(p):
+        return False
+    transform = 1 << max(2 * size - 1, 1).bit_length()
+    return (p - 1) % transform == 0
+
+def ntt_poly_mult(A, B, p):
+    """poly_mult on the NumPy engine"""
+    if not A or not B:
+        return []
+    field = ntt_field(p)
+    return field.mult(field.array(A)[None, :], field.array(B)[None, :])[0].tolist()
+
+def ntt_poly_mod(A, B, p):
+    """poly_mod on the NumPy engine, with leading zeros removed"""
+    B = [int(b) % p for b in B]
+    while B and B[-1] == 0:
+        B.pop()
+    if not B:
+        raise ValueError("Division by zero polynomial")
+    field = ntt_field(p)
+    lead_inv = pow(B[-1], p - 2, p)
+    M = field.array([b * lead_inv for b in B[:-1]])[None, :]
+    R = field.array(A)[None, :]
+    d = M.shape[1]
+    if R.shape[1] > d:
+        reversed_M = np.concatenate([np.ones((1, 1), dtype=np.uint64), M[:, ::-1]], axis=1)
+        R = field.monic_mod(R, M, field.inverse_series(reversed_M, R.shape[1] - d))
+    R = R[0].tolist()
+    while R and R[-1] == 0:
+        R.pop()
+    return R
+
+
+class NTTSubproductTree:
+    """
+    Subproduct tree on the NumPy engine, with the same interface as
+    SubproductTree: evaluate, interpolate, master and the derivative
+    values at the points.
+
+    Nodes are monic and stored without their leading 1. Level l holds the
+    full nodes, of degree 2^l, as the rows of one array, and separately the
+    single node at the end of the level that covers fewer points, if any.
+    Like in SubproductTree, a trailing node without a sibling is carried up
+    to the next level unchanged.
+
+    Work is vectorised instead of spread over processes, so the pool
+    arguments are accepted for compatibility and ignored.
+    """
+
+    def __init__(self, points, p):
+        self.points = list(points)
+        self.p = p
+        self.field = ntt_field(p)
+        self.x = self.field.array(self.points)
+        self.levels = self._build()
+        self._derivative_values = None
+        self._derivative_inverses = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self):
+        field = self.field
+        if not self.points:
+            return []
+        levels = [(field.neg(self.x)[:, None], None)]
+        while len(levels[-1][0]) + (levels[-1][1] is not None) > 1:
+            full, tail = levels[-1]
+            pairs = len(full) // 2
+            parents = field.monic_mult(full[0:2 * pairs:2], full[1:2 * pairs:2])
+            if len(full) % 2 == 0:
+                new_tail = tail
+            elif tail is None:
+                new_tail = full[-1]
+            else:
+                new_tail = field.monic_mult(full[-1:], tail[None, :])[0]
+            levels.append((parents, new_tail))
+        return levels
+
+    def node(self, level, index):
+        """Node index of the given level, a monic polynomial"""
+        full, tail = self.levels[level]
+        row = full[index] if index < len(full) else tail
+        return row.tolist() + [1]
+
+    def update(self, changes, length):
+        """
+        Move the tree to new points in place, like SubproductTree.update:
+        only the full nodes above a changed or dropped slot are multiplied
+        again, all of one level at once, and the short tail nodes at the
+        end of every level are rebuilt
+        """
+        field = self.field
+        old_points = self.points
+        points = old_points[:length] + [None] * (length - len(old_points))
+        for i, x in changes.items():
+            points[i] = x
+        if None in points:
+            raise ValueError("Every new slot needs a point")
+        self.points = points
+        self.x = field.array(points)
+        if not points:
+            self.levels = []
+            self._derivative_values = self._derivative_inverses = None
+            return
+
+        levels = [(field.neg(self.x)[:, None], None)]
+        dirty = set(changes) | set(range(length, len(old_points)))
+        while len(levels[-1][0]) + (levels[-1][1] is not None) > 1:
+            full, tail = levels[-1]
+            pairs = len(full) // 2
+            old = self.levels[len(levels)][0] if len(levels) < len(self.levels) else ()
+            parents = np.empty((pairs, 2 * full.shape[1]), dtype=np.uint64)
+            if len(old):
+                parents[:min(len(old), pairs)] = old[:pairs]
+            dirty = {i >> 1 for i in dirty} | set(range(len(old), pairs))
+            rows = np.array(sorted(i for i in dirty if i < pairs), dtype=np.int64)
+            if len(rows):
+                parents[rows] = field.monic_mult(full[2 * rows], full[2 * rows + 1])
+            if len(full) % 2 == 0:
+                new_tail = tail
+            elif tail is None:
+                new_tail = full[-1]
+            else:
+                new_tail = field.monic_mult(full[-1:], tail[None, :])[0]
+            levels.append((parents, new_tail))
+        self.levels = levels
+        self._derivative_values = None
+        inverses = update_derivative_inverses(self, old_points, self._derivative_inverses)
+        self._derivative_inverses = None if inverses is None else [int(w) for w in inverses]
+
+    def _tail_children(self, level_idx):
+        """
+        Children of the tail node of a level: a single carried node, given
+        as ('full', index) or ('tail', None), or the pair of the last full
+        node and the tail of the level below
+        """
+        full, tail = self.levels[level_idx - 1]
+        if len(full) % 2 == 0:
+            return [('tail', None)]
+        if tail is None:
+            return [('full', len(full) - 1)]
+        return [('full', len(full) - 1), ('tail', None)]
+
+    @property
+    def master(self):
+        """Master polynomial M(x) = product of (x - x_i)"""
+        if not self.levels:
+            return [1]
+        full, tail = self.levels[-1]
+        root = full[0] if len(full) else tail
+        return root.tolist() + [1]
+
+    def _scaled_children(self, S, M_left, M_right):
+        """
+        Scaled remainders of the children M_left and M_right (monic, without
+        their leading 1) of nodes with scaled remainders S. f / M_left is
+        M_right * f / (M_left * M_right), so the series of a child is a
+        middle product of its parent's series with its sibling.
+        """
+        field = self.field
+        d_left, d_right = M_left.shape[1], M_right.shape[1]
+        left_rev = np.concatenate([np.ones((len(M_left), 1), dtype=np.uint64), M_left[:, ::-1]], axis=1)
+        right_rev = np.concatenate([np.ones((len(M_right), 1), dtype=np.uint64), M_right[:, ::-1]], axis=1)
+        return (field.middle_product(S, right_rev, d_right, d_left),
+                field.middle_product(S, left_rev, d_left, d_right))
+
+    def evaluate(self, poly, pool=None):
+        """
+        Evaluate polynomial at all points of the tree
+
+        Descends the tree with scaled remainders instead of remainders:
+        every node N carries the coefficients of x^-1, ..., x^-deg N of
+        f / N. Only the root needs a power series inverse, and at a leaf
+        x - x_i the single coefficient left is f(x_i).
+        """
+        p = self.p
+        n = len(self.points)
+        if not self.points:
+            return []
+        if not poly:
+            return [0] * n
+        if n <= NTT_SCHOOLBOOK_LENGTH:
+            return [int(evaluate_poly(poly, x, p)) for x in self.points]
+        field = self.field
+
+        # Scaled remainder of the root: with f padded to m >= n
+        # coefficients, f / M = x^(m - 1 - n) rev(f)(1/x) / rev(M)(1/x)
+        m = max(len(poly), n)
+        f_rev = np.zeros((1, m), dtype=np.uint64)
+        f_rev[0, m - len(poly):] = field.array(poly)[::-1]
+        full, tail = self.levels[-1]
+        root = full[0] if len(full) else tail
+        root_rev = np.concatenate([np.ones(1, dtype=np.uint64), root[::-1]])[None, :]
+        S = field.middle_product(f_rev, field.inverse_series(root_rev, m), m - n, n)
+        full_S = S if len(full) else np.zeros((0, n), dtype=np.uint64)
+        tail_S = S[0] if tail is not None else None
+
+        for level_idx in range(len(self.levels) - 1, 0, -1):
+            children, child_tail = self.levels[level_idx - 1]
+            pairs = len(full_S)
+            new_full = np.empty(children.shape, dtype=np.uint64)
+            if pairs:
+                new_full[0:2 * pairs:2], new_full[1:2 * pairs:2] = self._scaled_children(
+                    full_S, children[0:2 * pairs:2], children[1:2 * pairs:2])
+            new_tail = None
+            if tail_S is not None:
+                tail_children = self._tail_children(level_idx)
+                if len(tail_children) == 2:
+                    left, right = self._scaled_children(tail_S[None, :], children[-1:], child_tail[None, :])
+                    new_full[-1], new_tail = left[0], right[0]
+                elif tail_children[0][0] == 'full':
+                    new_full[tail_children[0][1]] = tail_S
+                else:
+                    new_tail = tail_S
+            full_S, tail_S = new_full, new_tail
+
+        return full_S[:, 0].tolist()
+
+    @property
+    def derivative_values(self):
+        """M'(x_i) for every point, computed on first use"""
+        if self._derivative_values is None:
+            self._derivative_values = self.evaluate(poly_derivative(self.master, self.p))
+        return self._derivative_values
+
+    @property
+    def derivative_inverses(self):
+        """1 / M'(x_i) mod p for every point, computed on first use"""
+        if self._derivative_inverses is None:
+            inverses = []
+            for x, d in zip(self.points, self.derivative_values):
+                if d == 0:
+                    raise ValueError(f"Derivative is zero at point {x}, points might not be distinct")
+                inverses.append(int(gmpy2.invert(d, self.p)))
+            self._derivative_inverses = inverses
+        return self._derivative_inverses
+
+    def precompute(self):
+        """
+        Compute the derivative inverses now instead of on first use, so
+        the tree is complete before it is shared or saved
+        """
+        self.derivative_inverses
+        return self
+
+    def interpolate(self, values, pool=None):
+        """
+        Interpolate the polynomial taking values[i] at points[i]
+        """
+        p = self.p
+        n = len(self.points)
+        if len(values) != n:
+            raise ValueError("Number of values does not match the number of points")
+        if n == 0:
+            return []
+        if n == 1:
+            return [int(values[0]) % p]
+        field = self.field
+
+        # c_i = y_i / M'(x_i), the interpolation polynomials of the leaves
+        scaled = field.mul(field.array(values), field.array(self.derivative_inverses))
+        full_poly, tail_poly = scaled[:, None], None
+
+        # Node polynomial = left * M_right + right * M_left, with the
+        # monic M_right = x^h + R contributing left * R + x^h * left
+        for level_idx in range(1, len(self.levels)):
+            children, child_tail = self.levels[level_idx - 1]
+            pairs = len(children) // 2
+            left, right = full_poly[0:2 * pairs:2], full_poly[1:2 * pairs:2]
+            new_full = self._combine(left, right, children[0:2 * pairs:2], children[1:2 * pairs:2])
+            if len(children) % 2 == 0:
+                new_tail = tail_poly
+            elif child_tail is None:
+                new_tail = full_poly[-1]
+            else:
+                new_tail = self._combine(full_poly[-1:], tail_poly[None, :], children[-1:], child_tail[None, :])[0]
+            full_poly, tail_poly = new_full, new_tail
+
+        result = (full_poly[0] if len(full_poly) else tail_poly).tolist()
+        while result and result[-1] == 0:
+            result.pop()
+        return result
+
+    def _combine(self, left, right, M_left, M_right):
+        field = self.field
+        h_left, h_right = M_left.shape[1], M_right.shape[1]
+        combined = np.zeros((len(left), h_left + h_right), dtype=np.uint64)
+        combined[:, :h_left + h_right - 1] = field.add(
+            _pad_columns(field.mult(left, M_right), h_left + h_right - 1),
+            _pad_columns(field.mult(right, M_left), h_left + h_right - 1))
+        combined[:, h_right:] = field.add(combined[:, h_right:], left)
+        combined[:, h_left:] = field.add(combined[:, h_left:], right)
+        return combined
+
+
+def _pad_columns(A, width):
+    if A.shape[1] >= width:
+        return A[:, :width]
+    return np.concatenate([A, np.zeros((A.shape[0], width - A.shape[1]), dtype=np.uint64)], axis=1)
+
+
+def make_subproduct_tree(points, p):
+    """
+    Subproduct tree over points on the NumPy engine if it supports p,
+    otherwise the generic SubproductTree
+    """
+    points = list(points)
+    if ntt_supported(p, len(points)):
+        return NTTSubproductTree(points, p)
+    return SubproductTree(points, p)
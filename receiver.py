@@ -1,22 +1,110 @@
+import asyncio
+import copy
 import pickle
+import hashlib
+import os
 import socket
-import json
-import base64
-import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Set
-from utils import (H1, H2, diffie_hellman_key_agreement, encode_group_element, permutation_mapping, H3)
-from poly import fast_modular_interpolation
-import sys
+from utils import (H1, H2_bytes, H3_bytes)
+from group import SafePrimeGroup, hash_to_group
+from keypool import EncodingPool, generate_encodings
+from parallel import WorkerPool
+from wire import (MSG_BLINDED, MSG_END, MSG_EVALUATED, MSG_FILTER, MSG_FILTER_REQUEST, MSG_KEYS, MSG_KEYS_CHUNK, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK, MSG_PUBLIC_KEY, accept_hello, accept_hello_async, decode_elements, decode_keys, encode_elements, recv_frame, recv_frame_async, recv_hello_ack, recv_stream, recv_stream_async, send_frame, send_frame_async, send_hello, send_stream)
+from poly import fast_modular_interpolation, make_subproduct_tree
+from limbs import encode_limb_rows, interpolate_limbs
+from okvs import BandOKVS, encode_cells
+from bloom import BloomFilter
+from bins import assign_bins, bin_count, bin_size, bin_trees, encode_bins, interpolate_bins
 import time
 import gmpy2
 from gmpy2 import mpz
 
+# Default limits of Receiver.serve: concurrent sessions, and bytes a sender
+# may send in one session, enough for the keys of 2^20 elements
+MAX_SESSIONS = 8
+MAX_SESSION_BYTES = 64 << 20
+
+def encode_chunk(indices, group, key, iv, reject=True):
+    """
+    Step 3 for a chunk of set Y: a key pair (b_i, g^b_i) per index whose
+    encoded and permuted public key is below the field prime
+    """
+    return generate_encodings(len(indices), group, key, iv, reject)
+
+def session_key_chunk(items, group, m, uses):
+    """
+    Step 7 for a chunk of (y_i, b_i) pairs: H2(y_i, H3(m^b_i))
+    """
+    m_b = group.exp_many(m, [b_i for _, b_i in items], uses)
+    keys = []
+    for (y_i, _), m_b_i in zip(items, m_b):
+        kA_key2 = H3_bytes(group.to_bytes(m_b_i))
+        keys.append(H2_bytes(y_i, kA_key2))
+    return keys
+def blind_chunk(items, group, r):
+    """
+    Unbalanced mode for a chunk of set Y: H(y_i)^r with H the random
+    oracle onto the group
+    """
+    return group.exp_batch([hash_to_group(y_i, group) for y_i in items], r)
+
+def unblind_key_chunk(items, group, r_inv):
+    """
+    Unbalanced mode for a chunk of (y_i, H(y_i)^(r a)) pairs: remove r and
+    hash into H2(y_i, H3(H(y_i)^a)), the sender's key for y_i
+    """
+    elements = group.exp_batch([e for _, e in items], r_inv)
+    return [H2_bytes(y_i, H3_bytes(group.to_bytes(e))) for (y_i, _), e in zip(items, elements)]
+
 class Receiver:
-    def __init__(self, set_Y: Set[str]):
+    def __init__(self, set_Y: Set[str], workers: int = 1, chunk_size: int = 256, streaming: bool = False, group=None,
+                 field: int = None, encoder: str = 'poly', reuse_sessions: int = 1, reuse_seconds: float = None,
+                 bins: int = None):
         """
         Initialize Receiver with set Y
+
+        workers and chunk_size configure the process pool the per-element
+        steps and the interpolation are spread over. With streaming, the
+        polynomial is sent in chunks of chunk_size coefficients and the
+        sender's keys are matched chunk by chunk as they arrive. group is
+        the group the protocol runs in, see group.load_group; without one
+        the safe-prime group given by p, q, g and u is used. field, e.g.
+        limbs.DEFAULT_FIELD, is a small prime to interpolate over instead
+        of the group's prime, with every permuted encoding split into
+        limbs that get one polynomial each; the sender must use the same.
+        encoder is 'poly' to send the interpolated polynomial, or 'okvs'
+        to send a random band matrix key-value store instead, which is
+        encoded and decoded in linear time; field does not apply to it.
+        'bins' hashes set Y into bins bins, by default one per
+        bins.BIN_LOAD items, and sends one polynomial per bin padded with
+        dummy points to a common size, so the sender evaluates only its
+        items' bins; field does not apply to it either.
+        reuse_sessions and reuse_seconds opt into reusing one set of b_i
+        and its polynomial for several sessions, see session_encoding.
         """
+        if encoder not in ('poly', 'okvs', 'bins'):
+            raise ValueError(f"Unknown encoder {encoder}")
+        if bins is not None and bins < 1:
+            raise ValueError("Number of bins must be at least 1")
+        if reuse_sessions < 1:
+            raise ValueError("reuse_sessions must be at least 1")
         self.set_Y = set_Y
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.streaming = streaming
+        self.encoding_pool = None
+        self.group = group
+        self.field = field
+        self.encoder = encoder
+        self.bins = bins
+        self.reuse_sessions = reuse_sessions
+        self.reuse_seconds = reuse_seconds
+        self._reuse = None
+        self._reuse_lock = threading.Lock()
+        if group is not None:
+            self.p = group.field_prime
     
     def save_state(self, filename: str = "receiver_state.pkl"):
         """
@@ -24,6 +112,7 @@ class Receiver:
         """
         state = {
         "set_Y": self.set_Y,
+        "prepared": getattr(self, "prepared", None),
         }
         with open(filename, "wb") as f:
             pickle.dump(state, f)
@@ -36,75 +125,498 @@ class Receiver:
         """
         with open(filename, "rb") as f:
             state = pickle.load(f)
-        return cls(set_Y=state["set_Y"])
+        receiver = cls(set_Y=state["set_Y"])
+        receiver.prepared = state.get("prepared")
+        return receiver
+
+    def start_encoding_pool(self, size: int = 1024, filename: str = None) -> EncodingPool:
+        """
+        Pre-generate Step 3 key pairs in the background so a session draws
+        them instead of exponentiating after the sender connects. Pairs
+        persisted in filename by a previous EncodingPool.save are reused.
+        """
+        self.encoding_pool = EncodingPool(self.get_group(), self.key, self.iv, size)
+        if filename is not None and os.path.exists(filename):
+            self.encoding_pool.load(filename)
+        self.encoding_pool.start()
+        return self.encoding_pool
+
+    def get_group(self):
+        """
+        The group the protocol runs in
+        """
+        if self.group is not None:
+            return self.group
+        return SafePrimeGroup(self.p, self.q, self.g, self.u)
+
+    def interpolation_prime(self) -> int:
+        """
+        The prime the polynomial is interpolated over
+        """
+        return self.field if self.field is not None and self.encoder == 'poly' else self.p
+
+    def set_digest(self) -> str:
+        """
+        Digest identifying set Y, used to tell whether prepared state still matches it
+        """
+        digest = hashlib.sha256()
+        for y in self.set_Y:
+            item = y.encode('utf-8')
+            digest.update(len(item).to_bytes(4, 'big'))
+            digest.update(item)
+        return digest.hexdigest()
+
+    def prepare(self):
+        """
+        Offline phase: hash set Y and build the subproduct tree, M'(y_i) and
+        its inverses over the current prime. None of this depends on the
+        sender, so run_protocol only has to do the final linear combination
+        once the fresh values are known. Call save_state afterwards to keep
+        the result between runs.
+        """
+        prime = self.interpolation_prime()
+        if self.encoder == 'bins':
+            # The dummy points are drawn once here, their values every session
+            hashed_set_Y = [H1(y) for y in self.set_Y]
+            count = self.bins or bin_count(len(self.set_Y))
+            size = bin_size(len(self.set_Y), count)
+            members = assign_bins(hashed_set_Y, count, size)
+            self.prepared = {
+                "p": prime,
+                "encoder": self.encoder,
+                "set_digest": self.set_digest(),
+                "members": members,
+                "trees": bin_trees([h % prime for h in hashed_set_Y], members, size, prime),
+            }
+            return
+        if self.encoder == 'okvs':
+            # The bands of a key-value store are all there is to prepare.
+            # Whether they can be solved does not depend on the values, so
+            # one trial encoding settles the seed before any session uses it.
+            store = BandOKVS(self.set_Y)
+            store.encode([0] * len(self.set_Y), 1)
+            self.prepared = {
+                "p": prime,
+                "encoder": self.encoder,
+                "set_digest": self.set_digest(),
+                "store": store,
+            }
+            return
+        hashed_set_Y = [H1(y) % prime for y in self.set_Y]
+        tree = make_subproduct_tree(hashed_set_Y, prime).precompute()
+        self.prepared = {
+            "p": prime,
+            "encoder": self.encoder,
+            "set_digest": self.set_digest(),
+            "hashed_set_Y": hashed_set_Y,
+            "tree": tree,
+        }
+
+    def is_prepared(self) -> bool:
+        """
+        Check if the prepared state matches the current set Y, prime and
+        encoder
+        """
+        prepared = getattr(self, "prepared", None)
+        return (prepared is not None
+                and prepared["p"] == self.interpolation_prime()
+                and prepared.get("encoder", 'poly') == self.encoder
+                and prepared["set_digest"] == self.set_digest())
     
-    def run_protocol(self, host: str = 'localhost', port: int = 65432):
+    def session_keys(self, m=None, b_set=None, set_Y=None):
+        """
+        Step 7 keys H2(y_i, H3(m^b_i)) for every y_i, in the order of set Y,
+        for the current session unless m, b_set and set_Y are given
+        """
+        m = self.m if m is None else m
+        b_set = self.b_set if b_set is None else b_set
+        set_Y = self.set_Y if set_Y is None else set_Y
+        uses = -(-len(set_Y) // self.pool.workers)
+        return self.pool.map_chunks(session_key_chunk, list(zip(set_Y, b_set)), self.get_group(), m, uses)
+
+    def draw_encodings(self, group, count=None):
+        """
+        Step 3: a pair (b_i, permuted encoding of g^b_i) for every y_i, or
+        for count items, from the encoding pool if it was made for these
+        parameters
+        """
+        count = len(self.set_Y) if count is None else count
+        encoding_pool = self.encoding_pool
+        if encoding_pool is not None and encoding_pool.matches(group, self.key, self.iv):
+            return encoding_pool.draw(count)
+        return self.pool.map_chunks(encode_chunk, range(count), group, self.key, self.iv,
+                                    self.encoder == 'bins' or (self.encoder == 'poly' and self.field is None))
+
+    def encode_values(self, encode_perm_set, group, prepared=None):
+        """
+        Step 4: the polynomial or key-value store mapping every y_i to its
+        permuted encoding, its length n and a function encoding entries
+        start to stop - 1 for the wire, over the given prepared state or
+        the current one
+        """
+        if prepared is None:
+            if not self.is_prepared():
+                self.prepare()
+            prepared = self.prepared
+        if self.encoder == 'okvs':
+            store = prepared["store"]
+            Poly = store.encode(encode_perm_set, group.element_size)
+            # The store's header goes in front of its first cells
+            header = store.header()
+            return Poly, len(Poly), lambda start, stop: (header if start == 0 else b'') + encode_cells(Poly, group.element_size, start, stop)
+        if self.encoder == 'bins':
+            Poly = interpolate_bins(prepared["trees"], prepared["members"], encode_perm_set, self.pool)
+            # The bins' coefficients laid end to end, behind their header
+            return Poly, len(Poly) * len(Poly[0]), lambda start, stop: encode_bins(Poly, self.p, start, stop)
+        if self.field is not None:
+            buffers = [m_i_perm.to_bytes(group.element_size, 'big') for m_i_perm in encode_perm_set]
+            Poly = interpolate_limbs(prepared["tree"], buffers, self.pool)
+            # One row of limb coefficients per coefficient index
+            return Poly, len(encode_perm_set), lambda start, stop: encode_limb_rows(Poly, self.field, start, stop)
+        Poly = fast_modular_interpolation(prepared["hashed_set_Y"], encode_perm_set, self.p, tree=prepared["tree"], pool=self.pool)
+        return Poly, len(Poly), lambda start, stop: encode_elements(Poly[start:stop], self.p)
+
+    def _snapshot(self):
+        """
+        Set Y and the prepared state matching it, preparing first if
+        needed; called with the lock held
+        """
+        if not self.is_prepared():
+            self.prepare()
+        return self.set_Y, self.prepared
+
+    def _fresh_encoding(self, group, set_Y, prepared):
+        encodings = self.draw_encodings(group, len(set_Y))
+        b_set = [b_i for b_i, _ in encodings]
+        encode_perm_set = [m_i_perm for _, m_i_perm in encodings]
+        Poly, n, encode_range = self.encode_values(encode_perm_set, group, prepared)
+        return set_Y, b_set, encode_perm_set, Poly, n, encode_range
+
+    def session_encoding(self, group):
+        """
+        Steps 3 and 4 for one session: (set_Y, b_set, encode_perm_set, Poly,
+        n, encode_range), shared by up to reuse_sessions sessions. set_Y is
+        set Y as it was encoded; Step 7 must use it rather than the current
+        set Y, which update_set may change while the session runs.
+
+        Refresh policy: a fresh set of b_i and a fresh polynomial are made
+        once reuse_sessions sessions have used the current ones, once they
+        are older than reuse_seconds, and whenever set Y, the group, the
+        permutation key or the encoder changed. With the default of one
+        session per polynomial every session gets its own, as before.
+
+        Reuse only amortizes the receiver's encoding: every sender still
+        picks its own a, so the Step 7 keys H2(y_i, H3(m^b_i)) differ per
+        session. But all senders within one window receive the same
+        polynomial, so they can tell that they talked to the same set Y and
+        combine what they learned from it; keep the window short where
+        that matters. Updating set Y ends the window: an updated
+        polynomial P' sent next to P would reveal through P' - P, which
+        vanishes at every kept point, which items stayed in set Y.
+        """
+        if self.reuse_sessions == 1:
+            # Nothing is shared, so concurrent sessions need not wait on each other
+            with self._reuse_lock:
+                snapshot = self._snapshot()
+            return self._fresh_encoding(group, *snapshot)
+        fingerprint = (group.fingerprint(), self.key, self.iv, self.set_digest(), self.encoder, self.field)
+        with self._reuse_lock:
+            reuse = self._reuse
+            if (reuse is None or reuse["fingerprint"] != fingerprint
+                    or reuse["uses"] >= self.reuse_sessions
+                    or (self.reuse_seconds is not None and time.time() - reuse["created"] > self.reuse_seconds)):
+                reuse = self._reuse = {
+                    "fingerprint": fingerprint,
+                    "created": time.time(),
+                    "uses": 0,
+                    "encoding": self._fresh_encoding(group, *self._snapshot()),
+                }
+            reuse["uses"] += 1
+            return reuse["encoding"]
+
+    def update_set(self, add=(), remove=()):
+        """
+        Insert the items of add into set Y and delete those of remove,
+        updating the prepared state instead of preparing again
+
+        The items of add take the slots of the removed ones first; further
+        items are appended, and removed slots left over are filled with the
+        last items of set Y, so the order of set Y changes. Only the tree
+        nodes and derivative inverses those slots affect are recomputed,
+        see SubproductTree.update, on a copy of the tree, so sessions
+        still encoding over the old one are not disturbed. A polynomial
+        shared under reuse_sessions is dropped rather than updated, see
+        session_encoding. A key-value store is encoded in linear time
+        anyway and is prepared again.
+        """
+        set_Y = list(self.set_Y)
+        slot_of = {y: i for i, y in enumerate(set_Y)}
+        add, remove = list(add), list(remove)
+        if len(set(add)) != len(add) or any(y in slot_of for y in add):
+            raise ValueError("Items to add must be new and distinct")
+        if len(set(remove)) != len(remove) or any(y not in slot_of for y in remove):
+            raise ValueError("Items to remove must be in set Y and distinct")
+
+        # moves maps a slot to the old slot whose item it takes, or to
+        # None for a new item
+        free = sorted(slot_of[y] for y in remove)
+        moves = {}
+        for y in add:
+            slot = free.pop(0) if free else len(set_Y)
+            if slot == len(set_Y):
+                set_Y.append(y)
+            set_Y[slot] = y
+            moves[slot] = None
+        length = len(set_Y) - len(free)
+        holes = [slot for slot in free if slot < length]
+        free = set(free)
+        tail = [slot for slot in range(length, len(set_Y)) if slot not in free]
+        for slot, source in zip(holes, tail):
+            set_Y[slot] = set_Y[source]
+            moves[slot] = moves.pop(source, source)
+        set_Y = set_Y[:length]
+
+        with self._reuse_lock:
+            up_to_date = self.is_prepared() and self.encoder == 'poly' and length > 0
+            self.set_Y = set_Y
+            self._reuse = None
+            if not up_to_date:
+                self.prepared = None
+                return
+            prepared = self.prepared
+            prime = prepared["p"]
+            hashed_set_Y = prepared["hashed_set_Y"][:length] + [None] * (length - len(prepared["hashed_set_Y"]))
+            for slot, source in moves.items():
+                hashed_set_Y[slot] = H1(set_Y[slot]) % prime if source is None else prepared["hashed_set_Y"][source]
+            tree = copy.copy(prepared["tree"])
+            tree.update({slot: hashed_set_Y[slot] for slot in moves}, length)
+            self.prepared = dict(prepared, tree=tree, hashed_set_Y=hashed_set_Y, set_digest=self.set_digest())
+
+    def iter_matches(self, K_index: Set[bytes], set_Y=None):
+        """
+        Step 7: yield every y_i whose key H2(y_i, H3(m^b_i)) is in the
+        sender's key set, chunk by chunk as the keys are computed, over
+        set_Y as encoded for the session or the current set Y
+        """
+        set_Y = self.set_Y if set_Y is None else set_Y
+        uses = -(-len(set_Y) // self.pool.workers)
+        items = list(zip(set_Y, self.b_set))
+        start = 0
+        for keys in self.pool.imap_chunks(session_key_chunk, items, self.get_group(), self.m, uses):
+            for i, H_2 in enumerate(keys, start):
+                if H_2 in K_index:
+                    yield set_Y[i]
+            start += len(keys)
+
+    def run_protocol(self, host: str = 'localhost', port: int = 65432, on_match=None):
         """
         Run the PSI protocol as the Receiver
+
+        on_match, if given, is called with every element of the
+        intersection as soon as it is found
         """
         # Connect to sender
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        with WorkerPool(self.workers, self.chunk_size) as self.pool, socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.bind((host, port))
             s.listen(1)
             conn, addr = s.accept()
             with conn:
 
+                self.version = accept_hello(conn)
+                group = self.get_group()
+
                 # Step 2
-                data_size = struct.unpack('!I', conn.recv(4))[0]
-                data = conn.recv(data_size)
-                message = json.loads(data.decode('utf-8'))
-                self.m = str(message['m'])
-
-                # Step 3 
-                self.b_set = [0] * len(self.set_Y)
-                self.encode_perm_set = [0] * len(self.set_Y)
-                hashed_set_Y = [0] * len(self.set_Y)
-                for i in range(len(self.set_Y)):
-                    while True:
-                        b_i, m_i = diffie_hellman_key_agreement(self.g, self.q, self.p)
-                        m_i_encoded_bitstring = encode_group_element(m_i, self.p, self.u)
-                        m_i_perm = permutation_mapping(m_i_encoded_bitstring, self.key, self.iv)
-                        if int(m_i_perm,2) < self.p:
-                            break
-                    self.b_set[i] = b_i
-                    self.encode_perm_set[i] = m_i_perm
-                for i in range(len(self.set_Y)):
-                    hashed_set_Y[i] =  H1(self.set_Y[i])
-
-                # Step 4
-                encode_perm_set_as_int = [int(x, 2) for x in self.encode_perm_set]
+                _, data = recv_frame(conn, MSG_PUBLIC_KEY)
+                self.m = group.decode_public(data)
 
+                # Step 3 and 4
                 testTime = time.time()
 
-                self.Poly = fast_modular_interpolation(hashed_set_Y, encode_perm_set_as_int, self.p)
+                set_Y, self.b_set, self.encode_perm_set, self.Poly, n, encode_range = self.session_encoding(group)
 
                 teststoptime = time.time()
                 elapsed = teststoptime - testTime
                 print("time for fast_modular_interpolation: ", elapsed)
                 
                 print(f"Receiver made Polynomial\n")
-                sys.set_int_max_str_digits(0)
-                P_as_str = [str(f) for f in self.Poly]
-                m_json = json.dumps(P_as_str).encode('utf-8')
-                conn.sendall(struct.pack('!I', len(m_json)))
-                conn.sendall(m_json)
+                if self.streaming:
+                    chunks = (encode_range(i, min(i + self.chunk_size, n))
+                              for i in range(0, n, self.chunk_size))
+                    send_stream(conn, MSG_POLYNOMIAL_CHUNK, chunks)
+                else:
+                    send_frame(conn, MSG_POLYNOMIAL, encode_range(0, n))
                 
-                #step 6
-                data_size = struct.unpack('!I', conn.recv(4))[0]
-                data = conn.recv(data_size)
-                message = json.loads(data.decode('utf-8'))
-                self.K = [base64.b64decode(b) for b in message['K']]
-                # print(f"Receiver's K: {self.K}")
-
-                # Step 7
-                print(f"Starting to compute the Comparison\n")
-                self.Output = []
-                for i in range(len(self.set_Y)):
-                    g_a_b = gmpy2.powmod(mpz(int(self.m, 2)), mpz(self.b_set[i]), mpz(self.p))
-                    g_a_b_as_bitstring = format(g_a_b, '02048b')
-                    kA_key2 = H3((g_a_b_as_bitstring))
-                    H_2 = H2(self.set_Y[i], kA_key2)
-                    if H_2 in self.K:
-                        self.Output.append(self.set_Y[i])
+                if self.streaming:
+                    # Step 7 keys are computed while the sender evaluates, and
+                    # every chunk of K is matched as it arrives (step 6)
+                    key_index = {H_2: i for i, H_2 in enumerate(self.session_keys(set_Y=set_Y))}
+                    matched = []
+                    print(f"Starting to compute the Comparison\n")
+                    for data in recv_stream(conn, MSG_KEYS, MSG_KEYS_CHUNK):
+                        for k in decode_keys(data):
+                            i = key_index.pop(k, None)
+                            if i is not None:
+                                matched.append(i)
+                                if on_match is not None:
+                                    on_match(set_Y[i])
+                    self.Output = [set_Y[i] for i in sorted(matched)]
+                else:
+                    #step 6
+                    self.K = []
+                    for data in recv_stream(conn, MSG_KEYS, MSG_KEYS_CHUNK):
+                        self.K.extend(decode_keys(data))
+
+                    # Step 7
+                    print(f"Starting to compute the Comparison\n")
+                    self.Output = []
+                    for y_i in self.iter_matches(set(self.K), set_Y):
+                        self.Output.append(y_i)
+                        if on_match is not None:
+                            on_match(y_i)
                 print(f"Receiver's Output: {self.Output}")
                            
+
+    def query_unbalanced(self, host: str = 'localhost', port: int = 65432, on_match=None):
+        """
+        Query a sender serving the unbalanced mode, see
+        Sender.serve_unbalanced, for the intersection with set Y
+
+        The sender's Bloom filter is downloaded on the first query and
+        kept in sender_filter, so later queries against the same filter
+        cost bandwidth and exponentiations in the size of set Y only. Any
+        element of set Y has a chance of 2^-k to be output by a false
+        positive of the filter, for the filter's k hash functions.
+        """
+        group = self.get_group()
+        r = group.random_scalar()
+        r_inv = int(gmpy2.invert(mpz(r), group.q))
+        set_Y = list(self.set_Y)
+        cached = getattr(self, "sender_filter", None)
+        with WorkerPool(self.workers, self.chunk_size) as self.pool, socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.connect((host, port))
+            send_hello(s)
+            self.version = recv_hello_ack(s)
+            send_frame(s, MSG_FILTER_REQUEST, cached[0] if cached is not None else b'')
+            _, data = recv_frame(s, MSG_FILTER)
+            if data:
+                cached = self.sender_filter = (hashlib.sha256(data).digest(), BloomFilter.from_bytes(data))
+            elif cached is None:
+                raise ValueError("Sender sent no filter")
+            bloom = cached[1]
+
+            # The blinded items go out while nothing about them is known
+            # to the sender but their number
+            blinded = self.pool.map_chunks(blind_chunk, set_Y, group, r)
+            send_frame(s, MSG_BLINDED, encode_elements(blinded, group.p))
+            _, data = recv_frame(s, MSG_EVALUATED)
+            evaluated = decode_elements(data, group.p)
+            if len(evaluated) != len(set_Y):
+                raise ValueError("Sender evaluated a different number of items")
+            keys = self.pool.map_chunks(unblind_key_chunk, list(zip(set_Y, evaluated)), group, r_inv)
+
+        self.Output = []
+        for y_i, H_2 in zip(set_Y, keys):
+            if H_2 in bloom:
+                self.Output.append(y_i)
+                if on_match is not None:
+                    on_match(y_i)
+        print(f"Receiver's Output: {self.Output}")
+        return self.Output
+
+    def serve(self, host: str = 'localhost', port: int = 65432, sessions: int = None, **limits):
+        """
+        Serve senders on one listening socket until sessions sessions have
+        finished, or forever; see serve_async for the limits and for which
+        connections count as sessions
+        """
+        asyncio.run(self.serve_async(host, port, sessions, **limits))
+
+    async def serve_async(self, host: str = 'localhost', port: int = 65432, sessions: int = None,
+                          max_sessions: int = MAX_SESSIONS, max_session_bytes: int = MAX_SESSION_BYTES,
+                          on_output=None, ready=None):
+        """
+        Run the PSI protocol as the Receiver for any number of senders,
+        concurrently, on one listening socket
+
+        All sessions share set Y, the prepared tree or key-value store and
+        the worker pool; every session draws its own b_i and polynomial
+        unless reuse_sessions lets several share them.
+        The protocol steps run on a thread executor so the event loop keeps
+        serving other connections meanwhile. At most max_sessions sessions
+        run at once, further connections are closed right away, and a
+        sender may send at most max_session_bytes bytes in one session.
+        Connections closed at the cap are not sessions: they do not count
+        towards sessions, so serve_async returns only after that many
+        sessions ran, each ending with on_output or a failure.
+        on_output is called with the intersection of every finished
+        session, and ready, an asyncio.Event, is set once the socket
+        listens.
+        """
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        if not self.is_prepared():
+            self.prepare()
+        finished = asyncio.Event()
+        state = {"active": 0, "done": 0}
+
+        async def handle(reader, writer):
+            if state["active"] >= max_sessions:
+                writer.close()
+                return
+            state["active"] += 1
+            try:
+                output = await self._serve_session(reader, writer, executor, max_session_bytes)
+                if on_output is not None:
+                    on_output(output)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                print(f"Session failed: {e}")
+            finally:
+                state["active"] -= 1
+                state["done"] += 1
+                writer.close()
+                if sessions is not None and state["done"] >= sessions:
+                    finished.set()
+
+        with WorkerPool(self.workers, self.chunk_size) as self.pool, ThreadPoolExecutor(max_sessions) as executor:
+            server = await asyncio.start_server(handle, host, port)
+            async with server:
+                if ready is not None:
+                    ready.set()
+                if sessions is None:
+                    await server.serve_forever()
+                else:
+                    await finished.wait()
+
+    async def _serve_session(self, reader, writer, executor, max_session_bytes: int):
+        """
+        One session of serve_async; returns the intersection
+        """
+        loop = asyncio.get_running_loop()
+        group = self.get_group()
+        await accept_hello_async(reader, writer)
+
+        # Step 2
+        _, data = await recv_frame_async(reader, MSG_PUBLIC_KEY, max_session_bytes)
+        received = len(data)
+        m = group.decode_public(data)
+
+        # Step 3 and 4
+        set_Y, b_set, _, _, n, encode_range = await loop.run_in_executor(executor, self.session_encoding, group)
+        # Serializing the coefficients would stall every other session, so
+        # it runs on the executor too
+        if self.streaming:
+            for i in range(0, n, self.chunk_size):
+                data = await loop.run_in_executor(executor, encode_range, i, min(i + self.chunk_size, n))
+                await send_frame_async(writer, MSG_POLYNOMIAL_CHUNK, data)
+            await send_frame_async(writer, MSG_END)
+        else:
+            await send_frame_async(writer, MSG_POLYNOMIAL, await loop.run_in_executor(executor, encode_range, 0, n))
+
+        # Step 7 keys are computed while the sender evaluates and sends K
+        keys = loop.run_in_executor(executor, self.session_keys, m, b_set, set_Y)
+        K = set()
+        async for data in recv_stream_async(reader, MSG_KEYS, MSG_KEYS_CHUNK, max_session_bytes - received):
+            received += len(data)
+            K.update(decode_keys(data))
+        return [y_i for y_i, H_2 in zip(set_Y, await keys) if H_2 in K]
+
@@ -1,24 +1,85 @@
 import pickle
+import os
 import socket
-import json
-from fractions import Fraction
-import struct
-import base64
 from typing import Set
-from utils import (H1, H2, diffie_hellman_key_agreement, recv_all, inverse_permutation, shuffle_list, decode_group_element, H3)
-from poly import evaluate
-import base64
+from utils import (H1, H2_bytes, H3_bytes, inverse_permutation_batch, shuffle_list)
+from group import SafePrimeGroup, hash_to_group
+from poly import StreamingEvaluation
+from limbs import decode_limb_rows, finish_limbs, limb_count
+from okvs import decode_items
+from bloom import FALSE_POSITIVE_BITS, BloomFilter
+from bins import decode_bins, evaluate_bins
+from parallel import WorkerPool
+from wire import (MSG_BLINDED, MSG_EVALUATED, MSG_FILTER, MSG_FILTER_REQUEST, MSG_KEYS, MSG_KEYS_CHUNK, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK, MSG_PUBLIC_KEY, accept_hello, decode_elements, encode_elements, encode_keys, recv_frame, recv_hello_ack, recv_stream, send_frame, send_hello, send_stream)
+import hashlib
 import time
 import gmpy2
 from gmpy2 import mpz
 
 
+def sender_key_chunk(items, key, iv, group, a):
+    """
+    Step 5 for a chunk of (x_i, P(H1(x_i))) pairs, with P(H1(x_i)) as an
+    element-size buffer: invert the permutation, decode, raise to a and
+    hash into k_i' = H2(x_i, H3(g^(b a)))
+    """
+    P_h1_x = [P_h1_xi for _, P_h1_xi in items]
+    decoded_set = [group.decode(inverse_perm_P_h1_xi) for inverse_perm_P_h1_xi in inverse_permutation_batch(P_h1_x, key, iv)]
+
+    g_b_a_set = group.exp_batch(decoded_set, a)
+    K = [0] * len(items)
+    for i, (x_i, _) in enumerate(items):
+        k_i = H3_bytes(group.to_bytes(g_b_a_set[i]))
+        K[i] = H2_bytes(x_i, k_i)
+    return K
+
+
+def prf_key_chunk(items, group, key):
+    """
+    Unbalanced mode for a chunk of set X: H2(x_i, H3(H(x_i)^key)) with H
+    the random oracle onto the group
+    """
+    elements = group.exp_batch([hash_to_group(x_i, group) for x_i in items], key)
+    return [H2_bytes(x_i, H3_bytes(group.to_bytes(e))) for x_i, e in zip(items, elements)]
+
+
+def exp_chunk(elements, group, scalar):
+    """
+    element^scalar for a chunk of elements
+    """
+    return group.exp_batch(elements, scalar)
+
+# Default of Sender.serve_unbalanced: most items one receiver query may
+# ask the sender to evaluate
+MAX_QUERY = 1 << 16
+
+
 class Sender:
-    def __init__(self, set_X: Set[str]):
+    def __init__(self, set_X: Set[str], workers: int = 1, chunk_size: int = 256, streaming: bool = False, group=None,
+                 field: int = None, encoder: str = 'poly'):
         """
         Initialize Sender with set X
+
+        workers and chunk_size configure the process pool the per-element
+        steps and the evaluation are spread over. With streaming, K is sent
+        back one chunk at a time as it is computed. group is the group the
+        protocol runs in, see group.load_group; without one the safe-prime
+        group given by p, q, g and u is used. field is the small prime the
+        receiver interpolates the limbs of its encodings over, if any.
+        encoder is 'poly', 'okvs' or 'bins' and must match the receiver's;
+        the number of bins comes with the receiver's polynomials.
         """
+        if encoder not in ('poly', 'okvs', 'bins'):
+            raise ValueError(f"Unknown encoder {encoder}")
         self.set_X = set_X
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.streaming = streaming
+        self.group = group
+        self.field = field
+        self.encoder = encoder
+        if group is not None:
+            self.p = group.field_prime
         
     def save_state(self, filename: str = "sender_state.pkl"):
         """
@@ -26,9 +87,12 @@ class Sender:
         """
         state = {
             'set_X': self.set_X,
-            'params': self.params
+            'params': getattr(self, 'params', None),
+            'unbalanced': getattr(self, 'unbalanced', None),
         }
-        with open(filename, 'wb') as f:
+        # The unbalanced state holds the long-term key a, so the file is
+        # readable by its owner only
+        with os.fdopen(os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
             pickle.dump(state, f)
     
     @classmethod
@@ -41,68 +105,172 @@ class Sender:
         
         sender = cls(state['set_X'])
         sender.params = state['params']
+        sender.unbalanced = state.get('unbalanced')
         
         return sender
     
+    def get_group(self):
+        """
+        The group the protocol runs in
+        """
+        if self.group is not None:
+            return self.group
+        return SafePrimeGroup(self.p, self.q, self.g, self.u)
+
+    def set_digest(self) -> str:
+        """
+        Digest identifying set X, used to tell whether a prepared filter still matches it
+        """
+        digest = hashlib.sha256()
+        for x in self.set_X:
+            item = x.encode('utf-8')
+            digest.update(len(item).to_bytes(4, 'big'))
+            digest.update(item)
+        return digest.hexdigest()
+
+    def prepare_unbalanced(self, false_positive_bits: int = FALSE_POSITIVE_BITS):
+        """
+        Offline phase of the unbalanced mode: draw a long-term key a and
+        put H2(x, H3(H(x)^a)) for every x in a Bloom filter, where H is the
+        random oracle onto the group. This is the only work linear in set
+        X; receivers download the filter once and every query after that
+        costs the sender one exponentiation per receiver item. Call
+        save_state afterwards to keep the key and filter between runs, and
+        again after a change to set X, which needs a new key.
+        """
+        group = self.get_group()
+        key = group.random_scalar()
+        bloom = BloomFilter.for_count(len(self.set_X), false_positive_bits)
+        with WorkerPool(self.workers, self.chunk_size) as pool:
+            for keys in pool.imap_chunks(prf_key_chunk, list(self.set_X), group, key):
+                bloom.update(keys)
+        data = bloom.to_bytes()
+        self.unbalanced = {
+            "group": group.fingerprint(),
+            "set_digest": self.set_digest(),
+            "key": key,
+            "filter": data,
+            "filter_digest": hashlib.sha256(data).digest(),
+        }
+
+    def serve_unbalanced(self, host: str = 'localhost', port: int = 65432, sessions: int = None,
+                         max_query: int = MAX_QUERY):
+        """
+        Answer receiver queries in the unbalanced mode, one after another,
+        until sessions queries have been answered, or forever
+
+        Here the sender listens. A receiver sends the digest of the filter
+        it holds and gets the current filter unless that digest matches,
+        then sends H(y)^r for its items under a key r of its own and gets
+        back H(y)^(r a), from which it computes the keys of its items and
+        looks them up in the filter. The sender learns only how many items
+        were queried; max_query caps that per query, since every answered
+        item lets the receiver test one guess against set X.
+        """
+        if not (getattr(self, 'unbalanced', None) and self.unbalanced["set_digest"] == self.set_digest()
+                and self.unbalanced["group"] == self.get_group().fingerprint()):
+            self.prepare_unbalanced()
+        group = self.get_group()
+        key = self.unbalanced["key"]
+        served = 0
+        with WorkerPool(self.workers, self.chunk_size) as self.pool, socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((host, port))
+            s.listen()
+            while sessions is None or served < sessions:
+                conn, _ = s.accept()
+                with conn:
+                    try:
+                        self.version = accept_hello(conn)
+                        _, digest = recv_frame(conn, MSG_FILTER_REQUEST)
+                        current = self.unbalanced["filter_digest"]
+                        send_frame(conn, MSG_FILTER, b'' if digest == current else self.unbalanced["filter"])
+
+                        _, data = recv_frame(conn, MSG_BLINDED)
+                        blinded = decode_elements(data, group.p)
+                        if len(blinded) > max_query:
+                            raise ValueError(f"Query of {len(blinded)} items exceeds {max_query}")
+                        if not all(group.is_valid(e) for e in blinded):
+                            raise ValueError("Invalid group element in query")
+                        evaluated = self.pool.map_chunks(exp_chunk, blinded, group, key)
+                        send_frame(conn, MSG_EVALUATED, encode_elements(evaluated, group.p))
+                    except (ConnectionError, ValueError) as e:
+                        print(f"Query failed: {e}")
+                served += 1
+
     def start_protocol(self, host: str = 'localhost', port: int = 65432):
-        a, m = diffie_hellman_key_agreement(self.g, self.q, self.p)
+        group = self.get_group()
+        a, m = group.keygen()
         self.a = a
-        self.a = format(self.a, '02048b')
-        self.m = format(m, '02048b')
+        self.m = m
     
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        with WorkerPool(self.workers, self.chunk_size) as self.pool, socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.connect((host, port))
             runningTime = time.time()
-            # Send public key g^a mod p = m
-            m = {'m': self.m}
-            m_json = json.dumps(m).encode('utf-8')
-            s.sendall(struct.pack('!I', len(m_json)))
-            s.sendall(m_json)
+            send_hello(s)
+            self.version = recv_hello_ack(s)
+
+            # Send public key g^a = m
+            send_frame(s, MSG_PUBLIC_KEY, group.encode_public(self.m))
             print(f"Sender sent m\n")
 
+            # Step 5 preparation, overlapping the receiver's interpolation.
+            # Shuffling X up front gives K in random order without having
+            # to hold all of it before sending.
+            X = shuffle_list(self.set_X)
+            if self.encoder == 'poly':
+                prime = self.field if self.field is not None else self.p
+                Hashedset = [H1(x) % prime for x in X]
+            elif self.encoder == 'bins':
+                Hashedset = [H1(x) for x in X]
+
             #Step 4
-            size = struct.unpack('!I', recv_all(s, 4))[0]
-            data = recv_all(s, size)
-            P_as_str = json.loads(data.decode('utf-8'))
-            self.Poly = [Fraction(f) for f in P_as_str]
+            size = group.element_size
+            if self.encoder == 'okvs':
+                self.Poly = b''.join(recv_stream(s, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK))
+            elif self.encoder == 'bins':
+                self.Poly = decode_bins(b''.join(recv_stream(s, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK)), self.p)
+            elif self.field is not None:
+                # Rows of limb coefficients, transposed into one polynomial
+                # per limb; step 5 starts on every limb as its rows arrive
+                evaluations = [StreamingEvaluation(Hashedset, self.field) for _ in range(limb_count(size, self.field))]
+                for data in recv_stream(s, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK):
+                    rows = decode_limb_rows(data, self.field, len(evaluations))
+                    for evaluation, column in zip(evaluations, zip(*rows)):
+                        evaluation.extend(column)
+                self.Poly = [evaluation.coefficients for evaluation in evaluations]
+            else:
+                # Every chunk is validated as it is decoded, so the
+                # coefficients are never normalized again. Step 5 starts on
+                # every chunk as it arrives, unless the tree wins.
+                evaluation = StreamingEvaluation(Hashedset, self.p)
+                for data in recv_stream(s, MSG_POLYNOMIAL, MSG_POLYNOMIAL_CHUNK):
+                    evaluation.extend(decode_elements(data, self.p))
+                self.Poly = evaluation.coefficients
         
             #Step 5
-            self.K = [0] * len(self.set_X)
-
-            Hashedset = [0] * len(self.set_X)
-            for i in range(len(self.set_X)):
-                Hashedset = [H1(x) % self.p for x in self.set_X]
-
             start = time.time()
-            polyset = evaluate(self.Poly, Hashedset, self.p)
+            if self.encoder == 'okvs':
+                polyset = decode_items(X, self.Poly, size)
+            elif self.encoder == 'bins':
+                polyset = [int(v).to_bytes(size, 'big') for v in evaluate_bins(self.Poly, Hashedset, self.p, pool=self.pool)]
+            elif self.field is not None:
+                polyset = finish_limbs(evaluations, size, pool=self.pool)
+            else:
+                polyset = [int(v).to_bytes(size, 'big') for v in evaluation.result(self.pool)]
             end = time.time()
             print("This is the time for the eval function", end-start)
 
-            for i in range(len(self.set_X)):
-                P_h1_xi = polyset[i]
-                P_h1_xi = (int(P_h1_xi) * 1) % self.p
-                P_h1_xi_as_bitstring = format(int(P_h1_xi), '02048b')
-                inverse_perm_P_h1_xi = inverse_permutation(P_h1_xi_as_bitstring, self.key, self.iv)
-                inverse_perm_P_h1_xi_as_int = int(inverse_perm_P_h1_xi, 2)
-                inverse_perm_P_h1_xi_as_int_mod_p = inverse_perm_P_h1_xi_as_int % self.p
-                inverse_perm_P_h1_xi_as_int_mod_p_as_bitstring = format(inverse_perm_P_h1_xi_as_int_mod_p, '02048b') 
-                inverse_perm_P_h1_xi_as_int = int(inverse_perm_P_h1_xi_as_int_mod_p_as_bitstring, 2)
-                decoded_inverse_perm_P_h1_xi_as_fieldarray = decode_group_element(inverse_perm_P_h1_xi_as_int, self.p, self.q, self.u)
-                decoded_inverse_perm_P_h1_xi_as_bitstring = format(decoded_inverse_perm_P_h1_xi_as_fieldarray, '02048b')
-                decoded_inverse_perm_P_h1_xi_as_int = int(decoded_inverse_perm_P_h1_xi_as_bitstring, 2) 
-                g_b_a = gmpy2.powmod(mpz(decoded_inverse_perm_P_h1_xi_as_int), mpz(a), mpz(self.p))
-                g_b_a_as_bitstring = format(g_b_a, '02048b')
-                k_i = H3(g_b_a_as_bitstring)
-                k_i_prime = H2(self.set_X[i], k_i)
-                self.K[i] = k_i_prime
-
-            # Step 6    
-            self.K = shuffle_list(self.K)
-            encoded_K = [base64.b64encode(k).decode('utf-8') for k in self.K]
-            k_json = json.dumps({"K": encoded_K}).encode('utf-8')
-
-            s.sendall(struct.pack('!I', len(k_json)))
-            s.sendall(k_json)
+            items = list(zip(X, polyset))
+            if self.streaming:
+                # Step 5 and 6: send every chunk of K as soon as it is computed
+                K_chunks = self.pool.imap_chunks(sender_key_chunk, items, self.key, self.iv, group, a)
+                send_stream(s, MSG_KEYS_CHUNK, (encode_keys(K) for K in K_chunks))
+            else:
+                self.K = self.pool.map_chunks(sender_key_chunk, items, self.key, self.iv, group, a)
+
+                # Step 6    
+                send_frame(s, MSG_KEYS, encode_keys(self.K))
             end_time = time.time()  # Record the end time
             elapsed_time = end_time - runningTime
             print("-------------------------")
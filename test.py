@@ -1,15 +1,29 @@
-from utils import generate_safe_prime, permutation_mapping, inverse_permutation, assign_real_values, load_from_file, is_smaller_than_p512, encode_group_element, decode_group_element, diffie_hellman_key_agreement
+from utils import generate_safe_prime, permutation_mapping, inverse_permutation, assign_real_values, load_from_file, is_smaller_than_p512, encode_group_element, decode_group_element, diffie_hellman_key_agreement, H1
+from utils import element_size, encode_group_element_bytes, decode_group_element_bytes, permutation_mapping_bytes, inverse_permutation_bytes, permutation_mapping_batch, inverse_permutation_batch
 # interpolate_polynomial, evaluate_polynomial,
 import receiver
+import poly
+import batch_exp
+import wire
+import keypool
+import params
+import group
+import limbs
+import okvs
+import bins
+import bloom
+import socket
 import time
 import threading
 import sender
+import parallel
 import galois
 from Crypto.Random import get_random_bytes
 import base64
 import math
 import string
 import random
+import os
 
 def test(fn):
     def wrapper():
@@ -45,15 +59,17 @@ def permutation_test():
     assert restored_list == original_list, "Test failed: Restored list does not match the original list"
   
     
-def initialize(sender_set, receiver_set, filename=None):
+def initialize(sender_set, receiver_set, filename=None, workers=1, streaming=False, group=None, field=None, encoder='poly', bins=None, on_match=None):
     global receiver_data, sender_data
 
     # Create sender and receiver instances
-    sender_instance = sender.Sender(sender_set)
-    receiver_instance = receiver.Receiver(receiver_set)
+    sender_instance = sender.Sender(sender_set, workers=workers, chunk_size=64, streaming=streaming, group=group, field=field, encoder=encoder)
+    receiver_instance = receiver.Receiver(receiver_set, workers=workers, chunk_size=64, streaming=streaming, group=group, field=field, encoder=encoder, bins=bins)
 
-    if filename is None:
-        sender_instance, receiver_instance = assign_real_values(sender_instance, receiver_instance, generate_safe_prime())
+    if group is not None:
+        pass
+    elif filename is None:
+        sender_instance, receiver_instance = assign_real_values(sender_instance, receiver_instance, params.load_params())
     else:
         # Load sender and receiver state from file
         sender_instance, receiver_instance = assign_real_values(sender_instance, receiver_instance, load_from_file(filename))
@@ -70,7 +86,7 @@ def initialize(sender_set, receiver_set, filename=None):
 
     # Start the receiver in a thread first (because it needs to bind and listen)
     def run_receiver():
-        receiver_instance.run_protocol(host="localhost", port=65432)
+        receiver_instance.run_protocol(host="localhost", port=65432, on_match=on_match)
 
     receiver_thread = threading.Thread(target=run_receiver)
     receiver_thread.start()
@@ -174,6 +190,9 @@ def test_with_set_of_100():
 
 
 
+def scale_chunk(chunk, k):
+    return [k * x for x in chunk]
+
 def generate_random_string(min_length=5, max_length=15):
     """Generate a random string of letters and digits"""
     length = random.randint(min_length, max_length)
@@ -196,6 +215,206 @@ def test_with_set_of_generated_100():
     sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared)
     assert receiver_instance.Output == shared
 
+@test
+def test_with_set_of_generated_100_streaming():
+    set_size = 90
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, 'dummy_2048', streaming=True)
+    assert receiver_instance.Output == shared
+
+@test
+def test_on_match():
+    receiver_set = generate_string_set(90)
+    sender_set = generate_string_set(90)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    matches = []
+    sender_instance, receiver_instance = initialize(sender_set + shared, receiver_set + shared, 'dummy_2048',
+                                                    on_match=matches.append)
+    assert receiver_instance.Output == shared
+    assert matches == receiver_instance.Output
+
+    # iter_matches yields the matches of a chunk before computing the next one
+    session_key_chunk = receiver.session_key_chunk
+    chunks = []
+    receiver.session_key_chunk = lambda items, *args: chunks.append(items) or session_key_chunk(items, *args)
+    try:
+        with parallel.WorkerPool(1, 8) as receiver_instance.pool:
+            keys = session_key_chunk(list(zip(receiver_instance.set_Y, receiver_instance.b_set)),
+                                     receiver_instance.get_group(), receiver_instance.m, 1)
+            matches = receiver_instance.iter_matches({keys[i] for i in (2, 40, 95)})
+            assert next(matches) == receiver_instance.set_Y[2] and len(chunks) == 1
+            assert list(matches) == [receiver_instance.set_Y[i] for i in (40, 95)]
+    finally:
+        receiver.session_key_chunk = session_key_chunk
+
+
+@test
+def test_with_set_of_generated_100_curve25519():
+    set_size = 90
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, group=group.Curve25519Group())
+    assert receiver_instance.Output == shared
+
+@test
+def test_with_set_of_generated_100_limbs():
+    set_size = 90
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, 'dummy_2048', streaming=True, field=limbs.DEFAULT_FIELD)
+    assert receiver_instance.Output == shared
+
+@test
+def test_with_set_of_generated_100_okvs():
+    set_size = 90
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, 'dummy_2048', streaming=True, encoder='okvs')
+    assert receiver_instance.Output == shared
+
+@test
+def test_with_set_of_generated_100_bins():
+    set_size = 90
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, 'dummy_2048', streaming=True, encoder='bins', bins=4)
+    assert receiver_instance.Output == shared
+
+@test
+def test_receiver_server():
+    shared = ["hej", "hello", "hallo", "hi", "water"]
+    receiver_instance = receiver.Receiver(generate_string_set(40) + shared, chunk_size=16, streaming=True)
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    receiver_instance.key, receiver_instance.iv = get_random_bytes(32), get_random_bytes(16)
+    outputs = []
+    server_thread = threading.Thread(target=receiver_instance.serve, args=("localhost", 65433, 3),
+                                     kwargs={"max_sessions": 3, "on_output": outputs.append})
+    server_thread.start()
+    time.sleep(1)
+
+    def run_sender(items):
+        sender_instance = sender.Sender(items, chunk_size=16)
+        sender_instance.p, sender_instance.q, sender_instance.h, sender_instance.g, sender_instance.u = load_from_file('dummy_2048')
+        sender_instance.key, sender_instance.iv = receiver_instance.key, receiver_instance.iv
+        sender_instance.start_protocol(host="localhost", port=65433)
+
+    sender_threads = [threading.Thread(target=run_sender, args=(generate_string_set(30) + shared[:k],)) for k in (1, 3, 5)]
+    for thread in sender_threads:
+        thread.start()
+    for thread in sender_threads:
+        thread.join()
+    server_thread.join()
+    assert sorted(len(output) for output in outputs) == [1, 3, 5]
+    assert all(set(output) <= set(shared) for output in outputs)
+
+
+@test
+def test_receiver_server_cap():
+    receiver_instance = receiver.Receiver(generate_string_set(10))
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    server_thread = threading.Thread(target=receiver_instance.serve, args=("localhost", 65437, 1), kwargs={"max_sessions": 1})
+    server_thread.start()
+    time.sleep(1)
+    # The second connection is refused at the cap and is not a session
+    first = socket.create_connection(("localhost", 65437))
+    time.sleep(0.2)
+    second = socket.create_connection(("localhost", 65437))
+    assert second.recv(1) == b''
+    second.close()
+    time.sleep(0.2)
+    assert server_thread.is_alive()
+    first.close()
+    server_thread.join(10)
+    assert not server_thread.is_alive()
+
+
+@test
+def test_receiver_reuse():
+    shared = ["hej", "hello", "hallo", "hi", "water"]
+    receiver_instance = receiver.Receiver(generate_string_set(40) + shared, chunk_size=16, reuse_sessions=2)
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    receiver_instance.key, receiver_instance.iv = get_random_bytes(32), get_random_bytes(16)
+    draws = []
+    draw_encodings = receiver_instance.draw_encodings
+    receiver_instance.draw_encodings = lambda group, count=None: draws.append(group) or draw_encodings(group, count)
+    outputs = []
+    server_thread = threading.Thread(target=receiver_instance.serve, args=("localhost", 65434, 3),
+                                     kwargs={"max_sessions": 1, "on_output": outputs.append})
+    server_thread.start()
+    time.sleep(1)
+
+    # Three sessions with two per polynomial need two polynomials
+    for k in (1, 3, 5):
+        sender_instance = sender.Sender(generate_string_set(30) + shared[:k], chunk_size=16)
+        sender_instance.p, sender_instance.q, sender_instance.h, sender_instance.g, sender_instance.u = load_from_file('dummy_2048')
+        sender_instance.key, sender_instance.iv = receiver_instance.key, receiver_instance.iv
+        sender_instance.start_protocol(host="localhost", port=65434)
+    server_thread.join()
+    assert [sorted(output) for output in outputs] == [sorted(shared[:k]) for k in (1, 3, 5)]
+    assert len(draws) == 2
+
+
+@test
+def test_receiver_reuse_refresh():
+    receiver_instance = receiver.Receiver(generate_string_set(20), reuse_sessions=10, reuse_seconds=0)
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    receiver_instance.key, receiver_instance.iv = get_random_bytes(32), get_random_bytes(16)
+    group = receiver_instance.get_group()
+    with parallel.WorkerPool(1, 16) as receiver_instance.pool:
+        # Past reuse_seconds every session gets a fresh polynomial
+        first = receiver_instance.session_encoding(group)
+        assert receiver_instance.session_encoding(group) is not first
+        receiver_instance.reuse_seconds = None
+        first = receiver_instance.session_encoding(group)
+        assert receiver_instance.session_encoding(group) is first
+        # So does every session after the permutation key or iv changed
+        receiver_instance.key = get_random_bytes(32)
+        second = receiver_instance.session_encoding(group)
+        assert second is not first and receiver_instance._reuse["uses"] == 1
+        receiver_instance.iv = get_random_bytes(16)
+        assert receiver_instance.session_encoding(group) is not second
+
+
+@test
+def test_unbalanced():
+    shared = ["hej", "hello", "hallo", "hi", "water"]
+    sender_instance = sender.Sender(generate_string_set(200) + shared, chunk_size=16)
+    sender_instance.p, sender_instance.q, sender_instance.h, sender_instance.g, sender_instance.u = load_from_file('dummy_2048')
+    sender_instance.prepare_unbalanced()
+    server_thread = threading.Thread(target=sender_instance.serve_unbalanced, args=("localhost", 65436, 2))
+    server_thread.start()
+    time.sleep(1)
+
+    receiver_instance = receiver.Receiver(generate_string_set(20) + shared[:3], chunk_size=16)
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    assert sorted(receiver_instance.query_unbalanced(port=65436)) == sorted(shared[:3])
+    # The second query reuses the filter of the first
+    sender_filter = receiver_instance.sender_filter
+    receiver_instance.set_Y = generate_string_set(20) + shared[2:]
+    assert sorted(receiver_instance.query_unbalanced(port=65436)) == sorted(shared[2:])
+    assert receiver_instance.sender_filter is sender_filter
+    server_thread.join()
+    sender_instance.save_state("test_sender_state.pkl")
+    assert os.stat("test_sender_state.pkl").st_mode & 0o777 == 0o600
+    assert sender.Sender.load_state("test_sender_state.pkl").unbalanced == sender_instance.unbalanced
+    os.remove("test_sender_state.pkl")
+
+
+@test
+def test_with_set_of_generated_500_parallel():
+    set_size = 490
+    receiver_set = generate_string_set(set_size)
+    sender_set = generate_string_set(set_size)
+    shared = ["hej", "hello", "hallo", "hi", "water", "sun", "grape", "kiwi", "lemon", "mango"]
+    sender_instance, receiver_instance = initialize(sender_set+shared,receiver_set+shared, 'dummy_2048', workers=4)
+    assert receiver_instance.Output == shared
+
 @test
 def test_with_set_of_generated_500():
     # Generate a set of 100 unique random strings
@@ -282,6 +501,395 @@ def interpolation():
     
 
 
+@test
+def test_poly_mult_backends():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    for len_a, len_b in [(3, 7), (9, 30), (25, 31), (64, 64), (200, 17)]:
+        A = [random.randrange(p) for _ in range(len_a)]
+        B = [random.randrange(p) for _ in range(len_b)]
+        expected = [c % p for c in poly._schoolbook_mult(A, B)]
+        assert [c % p for c in poly._kronecker_mult(A, B)] == expected, f"Kronecker failed for {len_a}x{len_b}"
+        assert poly.poly_mult(A, B, p) == expected
+
+
+@test
+def test_poly_fast_mod():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    threshold = poly.NEWTON_DIVISION_THRESHOLD
+    for len_a, len_b in [(40, 3), (100, 50), (300, 7)]:
+        A = [random.randrange(p) for _ in range(len_a)]
+        B = [random.randrange(p) for _ in range(len_b)]
+        # Force plain long division for the reference remainder
+        poly.NEWTON_DIVISION_THRESHOLD = len_a + 1
+        expected = poly.poly_mod(A, B, p)
+        poly.NEWTON_DIVISION_THRESHOLD = threshold
+        assert poly.poly_fast_mod(A, B, p) == expected
+    # Coefficients outside 0..p-1 are reduced first
+    B = [random.randrange(p) for _ in range(7)] + [1]
+    expected = poly.poly_mod([p - 1] * 60, B, p)
+    assert poly.poly_fast_mod([-1] * 60, B, p) == expected
+    assert poly.poly_fast_mod([p - 1 + p] * 60, B, p) == expected
+    points = [random.randrange(p) for _ in range(100)]
+    coeffs = [random.randrange(p) for _ in range(120)]
+    assert poly.fast_multi_point_evaluation(coeffs, points, p) == [poly.evaluate_poly(coeffs, x, p) for x in points]
+
+
+@test
+def test_field_vector():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    A = poly.field_vector([random.randrange(p) for _ in range(20)], p)
+    assert poly.canonical(A, p) is A
+    assert poly.canonical([-1, p + 2], p) == [p - 1, 2]
+    product = poly.poly_mult(A, [3, -1], p)
+    assert isinstance(product, poly.FieldVector) and product.p == p and all(0 <= c < p for c in product)
+    assert isinstance(poly.poly_fast_mod(product, A, p), poly.FieldVector)
+    for values in ([p], [-1]):
+        try:
+            poly.field_vector(values, p)
+            assert False, "Out of range element was accepted"
+        except ValueError:
+            pass
+    assert isinstance(wire.decode_elements(wire.encode_elements(A, p), p), poly.FieldVector)
+
+
+@test
+def test_evaluation_methods():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    coeffs = [random.randrange(p) for _ in range(300)]
+    points = [random.randrange(p) for _ in range(40)]
+    expected = [poly.evaluate_poly(coeffs, x, p) for x in points]
+    assert poly.evaluate_poly_batch(coeffs, points, p) == expected
+    assert poly.evaluate_poly_batch(coeffs[:10], points, p) == [poly.evaluate_poly(coeffs[:10], x, p) for x in points]
+    assert poly.make_subproduct_tree(points, p).evaluate(coeffs) == expected
+    assert poly.evaluation_method(1 << 16, 100, p) == 'batched'
+    assert poly.evaluation_method(1 << 16, 1 << 12, p) == 'tree'
+    assert poly.evaluation_method(16, 3, p) == 'horner'
+    assert poly.fast_multi_point_evaluation(coeffs, points, p) == expected
+    # Streamed in uneven chunks, with blocked Horner running on the way
+    coeffs = [random.randrange(p) for _ in range(3 * poly.STREAM_EVALUATION_LENGTH + 5)]
+    evaluation = poly.StreamingEvaluation(points[:3], p)
+    for i in range(0, len(coeffs), 100):
+        evaluation.extend(coeffs[i:i + 100])
+    assert evaluation._done > 0
+    assert evaluation.result() == [poly.evaluate_poly(coeffs, x, p) for x in points[:3]]
+    # A worker pool keeps the chunks of imap_chunks in order
+    with parallel.WorkerPool(2, 3) as pool:
+        assert [y for chunk in pool.imap_chunks(scale_chunk, list(range(40)), 3) for y in chunk] == [3 * x for x in range(40)]
+
+
+@test
+def test_subproduct_tree_reuse():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    points = [random.randrange(p) for _ in range(50)]
+    values = [random.randrange(p) for _ in range(50)]
+    tree = poly.SubproductTree(points, p)
+    coeffs = poly.fast_modular_interpolation(points, values, p, tree=tree)
+    assert coeffs == poly.fast_modular_interpolation(points, values, p)
+    assert poly.evaluate(coeffs, points, p, tree=tree) == values
+
+
+@test
+def test_receiver_prepare():
+    receiver_set = generate_string_set(30)
+    receiver_instance = receiver.Receiver(receiver_set)
+    receiver_instance.p = load_from_file('dummy_2048')[0]
+    receiver_instance.prepare()
+    receiver_instance.save_state("test_receiver_state.pkl")
+    loaded = receiver.Receiver.load_state("test_receiver_state.pkl")
+    os.remove("test_receiver_state.pkl")
+    loaded.p = receiver_instance.p
+    assert loaded.is_prepared() and loaded.prepared["tree"]._derivative_inverses is not None
+    values = [random.randrange(loaded.p) for _ in receiver_set]
+    coeffs = poly.fast_modular_interpolation(None, values, loaded.p, tree=loaded.prepared["tree"])
+    assert poly.evaluate(coeffs, [H1(y) for y in receiver_set], loaded.p) == values
+    loaded.set_Y = loaded.set_Y + ["extra"]
+    assert not loaded.is_prepared()
+
+
+@test
+def test_batch_exp():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    exponents = [random.randint(1, q) for _ in range(20)]
+    table = batch_exp.FixedBaseTable(g, p, q.bit_length())
+    expected = [pow(g, e, p) for e in exponents]
+    assert table.pow_many(exponents) == expected
+    assert batch_exp.fixed_base_powmod_batch(g, exponents, p) == expected
+    bases = [random.randrange(1, p) for _ in range(20)]
+    assert batch_exp.fixed_exponent_powmod_batch(bases, exponents[0], p) == [pow(b, exponents[0], p) for b in bases]
+    for b, m in batch_exp.batch_key_agreement(table, q, 5):
+        assert pow(g, b, p) == m
+
+
+@test
+def test_wire_format():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    values = [0, 1, p - 1, random.randrange(p)]
+    assert wire.decode_elements(wire.encode_elements(values, p), p) == values
+    keys = [get_random_bytes(32) for _ in range(3)]
+    assert wire.decode_keys(wire.encode_keys(keys)) == keys
+    sender_sock, receiver_sock = socket.socketpair()
+    with sender_sock, receiver_sock:
+        wire.send_hello(sender_sock)
+        assert wire.accept_hello(receiver_sock) == wire.PROTOCOL_VERSION
+        assert wire.recv_hello_ack(sender_sock) == wire.PROTOCOL_VERSION
+        wire.send_hello(sender_sock, versions=(1,))
+        try:
+            wire.accept_hello(receiver_sock)
+            assert False, "Negotiated a version the receiver does not support"
+        except ValueError:
+            pass
+    # A hello shorter than the versions it announces is rejected
+    for payload in (b'', bytes([3, 2])):
+        try:
+            wire._pick_version(payload, wire.SUPPORTED_VERSIONS)
+            assert False, "Malformed hello was accepted"
+        except ValueError:
+            pass
+
+
+@test
+def test_bytes_native_encoding():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    key = get_random_bytes(32)
+    iv = get_random_bytes(16)
+    for i in range(10):
+        _, m = diffie_hellman_key_agreement(g, q, p)
+        encoded = encode_group_element_bytes(m, p, u)
+        assert len(encoded) == element_size(p)
+        permuted = permutation_mapping_bytes(encoded, key, iv)
+        assert decode_group_element_bytes(inverse_permutation_bytes(permuted, key, iv), p, q, u) == m
+        assert format(int.from_bytes(permuted, 'big'), '02048b') == permutation_mapping(format(int.from_bytes(encoded, 'big'), '02048b'), key, iv)
+
+
+@test
+def test_batch_permutation():
+    key = get_random_bytes(32)
+    iv = get_random_bytes(16)
+    elements = [get_random_bytes(256) for _ in range(20)]
+    permuted = permutation_mapping_batch(elements, key, iv)
+    assert permuted == [permutation_mapping_bytes(e, key, iv) for e in elements]
+    assert inverse_permutation_batch(permuted, key, iv) == elements
+
+
+@test
+def test_encoding_pool():
+    p, q, h, g, u = load_from_file('dummy_2048')
+    key = get_random_bytes(32)
+    iv = get_random_bytes(16)
+    pool = keypool.EncodingPool(group.SafePrimeGroup(p, q, g, u), key, iv, size=8, batch_size=4)
+    pool.start()
+    drawn = pool.draw(12)
+    pool.stop()
+    assert len(drawn) == 12 and len(set(b for b, _ in drawn)) == 12
+    for b, m_perm in drawn:
+        assert m_perm < p
+        encoded = inverse_permutation_bytes(m_perm.to_bytes(element_size(p), 'big'), key, iv)
+        assert decode_group_element_bytes(encoded, p, q, u) == pow(g, b, p)
+    pool.fill()
+    remaining = len(pool)
+    pool.save("test_encoding_pool.pkl")
+    assert os.stat("test_encoding_pool.pkl").st_mode & 0o777 == 0o600
+    loaded = keypool.EncodingPool(group.SafePrimeGroup(p, q, g, u), key, iv, size=8)
+    loaded.load("test_encoding_pool.pkl")
+    assert len(loaded) == remaining and not os.path.exists("test_encoding_pool.pkl")
+
+
+@test
+def test_params():
+    for bits in params.STANDARD_GROUPS:
+        assert params.validate_params(*params.standard_group(bits))
+    assert params.load_params(2048) == params.standard_group(2048)
+    # Entry k survives exactly when q = start + 2k and 2q + 1 are both free
+    # of odd primes below SIEVE_BOUND
+    start = params._random_start(256)
+    survivors = params.sieve_window(start, 512)
+    small = math.prod(params._SMALL_PRIMES)
+    for k, survivor in enumerate(survivors):
+        q = start + 2 * k
+        assert survivor == (math.gcd(q * (2 * q + 1), small) == 1), f"Wrong sieve entry {k}"
+    assert 0 < sum(survivors) < 512
+    store = params.ParameterStore("test_group_params.json")
+    generated = store.get_or_generate(256)
+    assert params.validate_params(*generated) and generated[0].bit_length() == 256
+    assert store.get(256) == generated and store.get(512) is None
+    p, q, h, g, u = generated
+    assert not params.validate_params(p, q, h, 1, u)
+    os.remove("test_group_params.json")
+
+
+@test
+def test_limbs():
+    field = limbs.DEFAULT_FIELD
+    for width in (32, 256):
+        buffers = [get_random_bytes(width) for _ in range(40)]
+        for buffer in buffers:
+            parts = limbs.split_limbs(buffer, field)
+            assert len(parts) == limbs.limb_count(width, field) and max(parts) < field
+            assert limbs.join_limbs(parts, width, field) == buffer
+        # A member's limbs must look like a non-member's, uniform in the
+        # field, including the top limb of every buffer
+        samples = [limbs.split_limbs(get_random_bytes(width), field) for _ in range(200)]
+        for column in zip(*samples):
+            assert max(column) > field // 2 and min(column) < field // 2
+        assert sum(limb >= 1 << 61 for parts in samples for limb in parts) > 0
+        tree = poly.SubproductTree([H1(str(i)) % field for i in range(len(buffers))], field)
+        polys = limbs.interpolate_limbs(tree, buffers)
+        assert limbs.evaluate_limbs(polys, tree.points, field, width) == buffers
+        data = limbs.encode_limb_rows(polys, field, 0, len(buffers))
+        rows = limbs.decode_limb_rows(data, field, len(polys))
+        assert [list(column) for column in zip(*rows)] == [poly_j + [0] * (len(buffers) - len(poly_j)) for poly_j in polys]
+
+
+@test
+def test_ntt_engine():
+    if not poly.ntt_supported(limbs.DEFAULT_FIELD):
+        return
+    for p in (limbs.DEFAULT_FIELD, 998244353):
+        A = [random.randrange(p) for _ in range(300)]
+        B = [random.randrange(p) for _ in range(45)]
+        assert poly.ntt_poly_mult(A, B, p) == [c % p for c in poly.poly_mult(A, B, p)]
+        assert poly.ntt_poly_mod(A, B, p) == [c % p for c in poly.poly_mod(A, B, p)]
+        for n in (1, 2, 9, 64, 100, 257):
+            points = random.sample(range(p), n)
+            tree = poly.make_subproduct_tree(points, p)
+            assert isinstance(tree, poly.NTTSubproductTree)
+            assert tree.master == [c % p for c in poly.SubproductTree(points, p).master]
+            values = [random.randrange(p) for _ in range(n)]
+            coeffs = tree.interpolate(values)
+            assert tree.evaluate(coeffs) == values
+            longer = [random.randrange(p) for _ in range(3 * n)]
+            assert tree.evaluate(longer) == [poly.evaluate_poly(longer, x, p) % p for x in points]
+    assert not poly.ntt_supported(load_from_file('dummy_2048')[0])
+
+
+@test
+def test_incremental_update():
+    for p in (limbs.DEFAULT_FIELD, load_from_file('dummy_2048')[0]):
+        points = random.sample(range(1, 1 << 40), 40)
+        tree = poly.make_subproduct_tree(points, p).precompute()
+        # Replace two points, drop the last five and append three
+        changes = {3: 1 << 41, 17: (1 << 41) + 1, 35: (1 << 41) + 2, 36: (1 << 41) + 3, 37: (1 << 41) + 4}
+        tree.update(changes, 38)
+        fresh = type(tree)(tree.points, p)
+        assert [int(c) for c in tree.master] == [int(c) for c in fresh.master]
+        assert [int(w) for w in tree.derivative_inverses] == [int(w) for w in fresh.derivative_inverses]
+        values = [random.randrange(p) for _ in range(38)]
+        assert [int(c) for c in tree.interpolate(values)] == [int(c) for c in fresh.interpolate(values)]
+
+    # An update leaves the tree of sessions under way alone and ends the
+    # window of a shared polynomial, so the next session gets a fresh one
+    shared = ["hej", "hello", "hallo", "hi", "water"]
+    receiver_instance = receiver.Receiver(generate_string_set(40) + shared[:4], chunk_size=16, reuse_sessions=2)
+    receiver_instance.p, receiver_instance.q, receiver_instance.h, receiver_instance.g, receiver_instance.u = load_from_file('dummy_2048')
+    receiver_instance.key, receiver_instance.iv = get_random_bytes(32), get_random_bytes(16)
+    outputs = []
+    server_thread = threading.Thread(target=receiver_instance.serve, args=("localhost", 65435, 2),
+                                     kwargs={"max_sessions": 1, "on_output": outputs.append})
+    server_thread.start()
+    time.sleep(1)
+    for k in range(2):
+        sender_instance = sender.Sender(generate_string_set(30) + shared, chunk_size=16)
+        sender_instance.p, sender_instance.q, sender_instance.h, sender_instance.g, sender_instance.u = load_from_file('dummy_2048')
+        sender_instance.key, sender_instance.iv = receiver_instance.key, receiver_instance.iv
+        sender_instance.start_protocol(host="localhost", port=65435)
+        if k == 0:
+            encoding = receiver_instance._reuse["encoding"]
+            tree = receiver_instance.prepared["tree"]
+            points = list(tree.points)
+            receiver_instance.update_set(add=["water"], remove=["hej", receiver_instance.set_Y[0]])
+            assert receiver_instance._reuse is None and tree.points == points
+            assert receiver_instance.prepared["tree"] is not tree
+    server_thread.join()
+    assert receiver_instance._reuse["encoding"] is not encoding and receiver_instance._reuse["uses"] == 1
+    assert receiver_instance._reuse["encoding"][0] == receiver_instance.set_Y
+    assert sorted(outputs[0]) == sorted(shared[:4])
+    assert sorted(outputs[1]) == sorted(shared[1:])
+    assert len(receiver_instance.set_Y) == 43
+
+
+@test
+def test_okvs():
+    items = [str(i) for i in range(300)]
+    values = [random.getrandbits(256) for _ in items]
+    store = okvs.BandOKVS(items)
+    cells = store.encode(values, 32)
+    assert len(cells) == okvs.store_size(len(items))
+    data = store.header() + okvs.encode_cells(cells, 32, 0, 100) + okvs.encode_cells(cells, 32, 100, len(cells))
+    assert okvs.decode_items(items + ["missing"], data, 32)[:-1] == [v.to_bytes(32, 'big') for v in values]
+    try:
+        okvs.decode_items(items, data[:-1], 32)
+        assert False, "Truncated store was accepted"
+    except ValueError:
+        pass
+
+
+@test
+def test_bins():
+    assert bins.bin_size(100, 1) == 100
+    assert 64 < bins.bin_size(1 << 16, 1 << 10) < 256
+    p = load_from_file('dummy_2048')[0]
+    hashed = [H1(str(i)) for i in range(200)]
+    count = bins.bin_count(len(hashed), 32)
+    size = bins.bin_size(len(hashed), count)
+    members = bins.assign_bins(hashed, count, size)
+    assert sorted(i for bin_members in members for i in bin_members) == list(range(200))
+    trees = bins.bin_trees([h % p for h in hashed], members, size, p)
+    values = [random.randrange(p) for _ in hashed]
+    polys = bins.interpolate_bins(trees, members, values)
+    assert all(len(poly) == size for poly in polys)
+    # Chunk boundaries need not fall on bin boundaries
+    data = b''.join(bins.encode_bins(polys, p, start, min(start + 50, count * size)) for start in range(0, count * size, 50))
+    decoded = bins.decode_bins(data, p)
+    assert decoded == polys
+    assert bins.evaluate_bins(decoded, hashed, p) == values
+    try:
+        bins.decode_bins(data[:-1], p)
+        assert False, "Truncated bins were accepted"
+    except ValueError:
+        pass
+
+
+@test
+def test_bloom():
+    keys = [get_random_bytes(32) for _ in range(1000)]
+    bloom_filter = bloom.BloomFilter.for_count(len(keys), 10)
+    bloom_filter.update(keys)
+    assert all(key in bloom_filter for key in keys)
+    assert sum(get_random_bytes(32) in bloom_filter for _ in range(1000)) < 10
+    data = bloom_filter.to_bytes()
+    assert all(key in bloom.BloomFilter.from_bytes(data) for key in keys)
+    try:
+        bloom.BloomFilter.from_bytes(data[:-1])
+        assert False, "Truncated filter was accepted"
+    except ValueError:
+        pass
+
+
+@test
+def test_groups():
+    # RFC 7748 X25519 test vector, little-endian with the scalar clamped
+    scalar = int.from_bytes(bytes.fromhex("a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4"), 'little')
+    scalar = (scalar & ~7 & ((1 << 255) - 1)) | (1 << 254)
+    point = int.from_bytes(bytes.fromhex("e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c"), 'little')
+    expected = bytes.fromhex("c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552")
+    assert int(group.x25519_ladder(scalar, point)).to_bytes(32, 'little') == expected
+    # Short scalars run through the same 255 steps
+    assert group.x25519_ladder(1, 9) == 9
+    assert group.x25519_ladder(3, group.x25519_ladder(5, 9)) == group.x25519_ladder(15, 9)
+    for G in (group.load_group("curve25519"), group.load_group(load_from_file('dummy_2048'))):
+        a, m_a = G.keygen()
+        b, m_b = G.keygen()
+        assert G.exp(m_a, b) == G.exp(m_b, a)
+        assert G.decode_public(G.encode_public(m_a)) == m_a
+        encoded = 0
+        for _, m in G.keygen_batch(20):
+            data = G.encode(m)
+            if data is not None:
+                assert len(data) == G.element_size and G.decode(data) == m
+                encoded += 1
+        assert encoded > 0
+
+
 @test
 def test_galois():
     p, q, h, g, u = generate_safe_prime()
@@ -447,12 +1055,43 @@ def test_with_set_of_2_to_power_16_and_12():
 # test_load_from_file()
 # test_real_perm()
 # test_encode_decode()
+# test_poly_mult_backends()
+# test_poly_fast_mod()
+# test_field_vector()
+# test_evaluation_methods()
+# test_subproduct_tree_reuse()
+# test_receiver_prepare()
+# test_batch_exp()
+# test_wire_format()
+# test_bytes_native_encoding()
+# test_batch_permutation()
+# test_encoding_pool()
+# test_params()
+# test_groups()
+# test_limbs()
+# test_ntt_engine()
+# test_incremental_update()
+# test_okvs()
+# test_bloom()
+# test_bins()
 # test_with_set_of_4() 
 # test_with_set_of_10() 
 # test_with_set_of_50() 
 # test_with_set_of_100() 
 # test_with_set_of_generated_100()
+# test_with_set_of_generated_100_streaming()
+# test_on_match()
+# test_with_set_of_generated_100_curve25519()
+# test_with_set_of_generated_100_limbs()
+# test_with_set_of_generated_100_okvs()
+# test_with_set_of_generated_100_bins()
 # test_with_set_of_generated_500() 
+# test_with_set_of_generated_500_parallel()
+# test_receiver_server()
+# test_receiver_server_cap()
+# test_receiver_reuse()
+# test_receiver_reuse_refresh()
+# test_unbalanced()
 # test_with_set_of_1000() # 128
 # test_with_set_of_2000() # 346.24, 321.41, 63.82, 51 :OOOO  😎 
 # test_with_set_of_4000() # 165.56
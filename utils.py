@@ -2,15 +2,15 @@ import random
 import hashlib
 import sympy
 import secrets
-from typing import Tuple
+from typing import List, Tuple
 from Crypto.Cipher import AES
-from Crypto.Util.number import getPrime, isPrime
 import gmpy2
 from gmpy2 import mpz
+from params import search_safe_prime
 
 
 
-def generate_safe_prime() -> Tuple[int, int, int, int, int]:
+def generate_safe_prime(bits: int = 2048, workers: int = 1) -> Tuple[int, int, int, int, int]:
     """
     Generate a safe prime p = 2q + 1 where q is also prime
     Return (p, q, g, u) where:
@@ -18,15 +18,14 @@ def generate_safe_prime() -> Tuple[int, int, int, int, int]:
     - q is the prime such that p = 2q + 1
     - g is a generator of the subgroup of order q
     - u is an element such that u^q ≠ 1 (mod p)
+    The search sieves q and 2q + 1 together, see params.search_safe_prime;
+    params.load_params avoids the search altogether.
     """
-    while True:
-        q = getPrime(2047)
-        p = 2*q + 1
-
-        if isPrime(p):
-            g, h = find_generator(p, q)
-            u = find_non_subgroup_element(p, q)
-            return p, q, h, g, u
+    p = search_safe_prime(bits, workers)
+    q = (p - 1) // 2
+    g, h = find_generator(p, q)
+    u = find_non_subgroup_element(p, q)
+    return p, q, h, g, u
 
 def find_generator(p: int, q: int) -> Tuple[int, int]:
     """
@@ -142,6 +141,90 @@ def inverse_permutation(encrypted_bitstring: str, key: bytes, iv: bytes) -> str:
     decrypted_data_as_bitstring = format(int.from_bytes(decrypted_data, 'big'), '02048b')
     return decrypted_data_as_bitstring
 
+def element_size(p: int) -> int:
+    """
+    Byte width of the fixed-size buffers group elements are handled in:
+    the byte length of p rounded up to whole AES blocks
+    """
+    return -(-((int(p).bit_length() + 7) // 8) // 16) * 16
+
+def H3_bytes(data: bytes) -> bytes:
+    """
+    Random oracle H₃ on a fixed-width element buffer, as a 256-bit key
+    """
+    return hashlib.sha256(data).digest()
+
+def H2_bytes(x: str, k: bytes) -> bytes:
+    """
+    Random oracle H₂: {0,1}* × {0,1}^256 → {0,1}^256 on a raw key
+    """
+    item = x.encode('utf-8')
+    return hashlib.sha256(len(item).to_bytes(4, 'big') + item + k).digest()
+
+def encode_group_element_bytes(x: int, p: int, u: int) -> bytes:
+    """
+    Same encoding as encode_group_element, as a fixed-width byte buffer
+    """
+    if secrets.randbelow(2) == 0:
+        value = x % p
+    else: 
+        value = (u*x) % p
+    return int(value).to_bytes(element_size(p), 'big')
+
+def decode_group_element_bytes(encoded: bytes, p: int, q: int, u: int) -> int:
+    """
+    Decode a fixed-width byte buffer back to a group element
+    """
+    return decode_group_element(int.from_bytes(encoded, 'big'), p, q, u)
+
+def permutation_mapping_bytes(x_bytes: bytes, key: bytes, iv: bytes) -> bytes:
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return cipher.encrypt(x_bytes)
+
+def inverse_permutation_bytes(encrypted_bytes: bytes, key: bytes, iv: bytes) -> bytes:
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return cipher.decrypt(encrypted_bytes)
+
+def permutation_mapping_batch(elements: List[bytes], key: bytes, iv: bytes) -> List[bytes]:
+    """
+    permutation_mapping_bytes for many equal-width elements with a single
+    cipher setup. Every element is still its own CBC chain starting from
+    iv: block j of all elements is XORed with their previous ciphertext
+    block and encrypted in one ECB call.
+    """
+    if not elements:
+        return []
+    width = len(elements[0])
+    if width % 16 or any(len(e) != width for e in elements):
+        raise ValueError("Elements must all have the same width, a multiple of 16 bytes")
+    size = 16 * len(elements)
+    cipher = AES.new(key, AES.MODE_ECB)
+    previous = int.from_bytes(iv * len(elements), 'big')
+    columns = []
+    for j in range(0, width, 16):
+        column = b''.join([e[j:j + 16] for e in elements])
+        encrypted = cipher.encrypt((int.from_bytes(column, 'big') ^ previous).to_bytes(size, 'big'))
+        columns.append(encrypted)
+        previous = int.from_bytes(encrypted, 'big')
+    return [b''.join([column[i:i + 16] for column in columns]) for i in range(0, size, 16)]
+
+def inverse_permutation_batch(elements: List[bytes], key: bytes, iv: bytes) -> List[bytes]:
+    """
+    inverse_permutation_bytes for many equal-width elements with a single
+    cipher setup. CBC decryption has no chaining dependency, so all blocks
+    are decrypted in one ECB call and XORed with their predecessors at once.
+    """
+    if not elements:
+        return []
+    width = len(elements[0])
+    if width % 16 or any(len(e) != width for e in elements):
+        raise ValueError("Elements must all have the same width, a multiple of 16 bytes")
+    cipher = AES.new(key, AES.MODE_ECB)
+    data = b''.join(elements)
+    previous = b''.join([iv + e[:-16] for e in elements])
+    decrypted = (int.from_bytes(cipher.decrypt(data), 'big') ^ int.from_bytes(previous, 'big')).to_bytes(len(data), 'big')
+    return [decrypted[i:i + width] for i in range(0, len(data), width)]
+
 def diffie_hellman_key_agreement(g: int, q: int, p: int) -> Tuple[int, int]:
     """
     Generate Diffie-Hellman key pair (private_key, public_key)
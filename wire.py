@@ -0,0 +1,220 @@
+import struct
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Sequence, Tuple
+from poly import FieldVector, field_vector
+from utils import recv_all
+
+# Protocol versions this implementation speaks, newest last. Version 1 was
+# the JSON/bitstring format and is no longer supported.
+PROTOCOL_VERSION = 2
+SUPPORTED_VERSIONS = (2,)
+
+# Message types
+MSG_HELLO = 1
+MSG_HELLO_ACK = 2
+MSG_PUBLIC_KEY = 3
+MSG_POLYNOMIAL = 4
+MSG_KEYS = 5
+MSG_POLYNOMIAL_CHUNK = 6
+MSG_KEYS_CHUNK = 7
+MSG_END = 8
+# Unbalanced mode, see Sender.serve_unbalanced
+MSG_FILTER_REQUEST = 9
+MSG_FILTER = 10
+MSG_BLINDED = 11
+MSG_EVALUATED = 12
+
+# Size of the keys H2 outputs
+KEY_SIZE = 32
+
+# Frame header: payload length (including the type byte) and message type
+_HEADER = struct.Struct('!IB')
+
+
+def send_frame(sock, msg_type: int, payload: bytes = b''):
+    """
+    Send one length-prefixed frame
+    """
+    sock.sendall(_HEADER.pack(len(payload) + 1, msg_type) + payload)
+
+
+def recv_frame(sock, expected_type: int = None) -> Tuple[int, bytes]:
+    """
+    Receive one frame, optionally checking its message type
+    """
+    length, msg_type = _HEADER.unpack(recv_all(sock, _HEADER.size))
+    payload = recv_all(sock, length - 1)
+    if expected_type is not None and msg_type != expected_type:
+        raise ValueError(f"Expected message type {expected_type}, got {msg_type}")
+    return msg_type, payload
+
+
+def send_stream(sock, chunk_type: int, payloads: Iterable[bytes]):
+    """
+    Send payloads as a stream of chunk frames closed by an end frame
+    """
+    for payload in payloads:
+        send_frame(sock, chunk_type, payload)
+    send_frame(sock, MSG_END)
+
+
+def recv_stream(sock, whole_type: int, chunk_type: int) -> Iterator[bytes]:
+    """
+    Yield the payloads of a message that arrives either as one frame of
+    whole_type or as a stream of chunk_type frames closed by an end frame
+    """
+    msg_type, payload = recv_frame(sock)
+    if msg_type == whole_type:
+        yield payload
+        return
+    while msg_type != MSG_END:
+        if msg_type != chunk_type:
+            raise ValueError(f"Expected message type {chunk_type}, got {msg_type}")
+        yield payload
+        msg_type, payload = recv_frame(sock)
+
+
+async def send_frame_async(writer, msg_type: int, payload: bytes = b''):
+    """
+    send_frame on an asyncio stream writer
+    """
+    writer.write(_HEADER.pack(len(payload) + 1, msg_type) + payload)
+    await writer.drain()
+
+
+async def recv_frame_async(reader, expected_type: int = None, limit: Optional[int] = None) -> Tuple[int, bytes]:
+    """
+    recv_frame on an asyncio stream reader, rejecting payloads of more
+    than limit bytes before reading them
+    """
+    length, msg_type = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if limit is not None and length - 1 > limit:
+        raise ValueError("Frame exceeds the size limit")
+    payload = await reader.readexactly(length - 1)
+    if expected_type is not None and msg_type != expected_type:
+        raise ValueError(f"Expected message type {expected_type}, got {msg_type}")
+    return msg_type, payload
+
+
+async def send_stream_async(writer, chunk_type: int, payloads: Iterable[bytes]):
+    """
+    send_stream on an asyncio stream writer
+    """
+    for payload in payloads:
+        await send_frame_async(writer, chunk_type, payload)
+    await send_frame_async(writer, MSG_END)
+
+
+async def recv_stream_async(reader, whole_type: int, chunk_type: int, limit: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    recv_stream on an asyncio stream reader, with at most limit bytes of
+    payload over the whole message
+    """
+    msg_type, payload = await recv_frame_async(reader, limit=limit)
+    if msg_type == whole_type:
+        yield payload
+        return
+    while msg_type != MSG_END:
+        if msg_type != chunk_type:
+            raise ValueError(f"Expected message type {chunk_type}, got {msg_type}")
+        yield payload
+        if limit is not None:
+            limit -= len(payload)
+        msg_type, payload = await recv_frame_async(reader, limit=limit)
+
+
+def field_width(p: int) -> int:
+    """
+    Number of bytes of a field element modulo p on the wire
+    """
+    return (int(p).bit_length() + 7) // 8
+
+
+def encode_elements(values: Sequence[int], p: int) -> bytes:
+    """
+    Encode field elements as fixed-width big-endian integers
+    """
+    width = field_width(p)
+    return b''.join(int(v).to_bytes(width, 'big') for v in values)
+
+
+def decode_elements(data: bytes, p: int) -> FieldVector:
+    """
+    Decode fixed-width big-endian field elements, rejecting values >= p,
+    as a FieldVector the poly routines take without normalizing again
+    """
+    width = field_width(p)
+    if len(data) % width:
+        raise ValueError("Truncated field element")
+    return field_vector((int.from_bytes(data[i:i + width], 'big') for i in range(0, len(data), width)), p)
+
+
+def encode_keys(keys: Sequence[bytes]) -> bytes:
+    """
+    Concatenate raw 32-byte keys
+    """
+    if any(len(k) != KEY_SIZE for k in keys):
+        raise ValueError("Invalid key size")
+    return b''.join(keys)
+
+
+def decode_keys(data: bytes) -> List[bytes]:
+    """
+    Split concatenated raw 32-byte keys
+    """
+    if len(data) % KEY_SIZE:
+        raise ValueError("Truncated key")
+    return [data[i:i + KEY_SIZE] for i in range(0, len(data), KEY_SIZE)]
+
+
+def send_hello(sock, versions: Sequence[int] = SUPPORTED_VERSIONS):
+    """
+    Connecting side of the negotiation, the sender except in unbalanced
+    mode: offer the supported versions
+    """
+    send_frame(sock, MSG_HELLO, bytes([len(versions)]) + bytes(versions))
+
+
+def recv_hello_ack(sock) -> int:
+    """
+    Connecting side of the negotiation: the version the other side picked
+    """
+    _, payload = recv_frame(sock, MSG_HELLO_ACK)
+    if len(payload) != 1:
+        raise ValueError("Malformed hello acknowledgement")
+    version = payload[0]
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError("No common protocol version")
+    return version
+
+
+def accept_hello(sock, versions: Sequence[int] = SUPPORTED_VERSIONS) -> int:
+    """
+    Listening side of the negotiation: pick the newest version both sides
+    support and acknowledge it; 0 tells the other side there is none
+    """
+    _, payload = recv_frame(sock, MSG_HELLO)
+    version = _pick_version(payload, versions)
+    send_frame(sock, MSG_HELLO_ACK, bytes([version]))
+    if not version:
+        raise ValueError("No common protocol version")
+    return version
+
+
+async def accept_hello_async(reader, writer, versions: Sequence[int] = SUPPORTED_VERSIONS) -> int:
+    """
+    accept_hello on an asyncio stream
+    """
+    _, payload = await recv_frame_async(reader, MSG_HELLO, limit=256)
+    version = _pick_version(payload, versions)
+    await send_frame_async(writer, MSG_HELLO_ACK, bytes([version]))
+    if not version:
+        raise ValueError("No common protocol version")
+    return version
+
+
+def _pick_version(payload: bytes, versions: Sequence[int]) -> int:
+    if not payload or len(payload) != 1 + payload[0]:
+        raise ValueError("Malformed hello")
+    offered = set(payload[1:1 + payload[0]])
+    common = offered.intersection(versions)
+    return max(common) if common else 0